@@ -0,0 +1,320 @@
+''' Benchmarks for the hot paths: JPEG to frame conversion, frame cache
+loading, the display path, transitions and the LED timeline.
+
+Everything runs on synthetic fixtures and a mock SPI sink, so no hardware
+is needed. Results are written as JSON and compared against a stored
+baseline (run with --update-baseline on the Pi to store a new one):
+
+    python3 benchmarks/bench.py
+    python3 benchmarks/bench.py --update-baseline
+'''
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict
+
+ROOT_PATH = Path(__file__).absolute().parent.parent
+sys.path.append(str(ROOT_PATH.joinpath('src')))
+
+import numpy as np
+from PIL import Image
+
+from display import Display, DisplayWriter
+from led import Led
+from overlay import Compositor, Overlay
+from panel import FRAME_SIZE, PANEL_WIDTH, PANEL_HEIGHT
+from transition import crossfade, wipe
+from videoplayer import VideoPlayer, LedPlayer, DEFAULT_LED_CSV
+
+
+BASELINE_PATH = str(ROOT_PATH.joinpath('benchmarks', 'baseline.json'))
+OUTPUT_PATH   = str(ROOT_PATH.joinpath('bench_output.json'))
+
+# Allowed slowdown before a metric counts as a regression
+DEFAULT_TOLERANCE = 0.2
+
+# Synthetic video, roughly what ffmpeg produces from an uploaded clip
+FIXTURE_FRAMES = 90
+FIXTURE_SIZE   = (640, 360)
+FIXTURE_FPS    = 30
+
+DISPLAY_FRAMES    = 1000
+# Frames sent over the simulated bus, which is slow
+SPI_FRAMES        = 200
+SPI_HZ            = 24000000
+TRANSITION_FRAMES = 200
+LED_STEPS         = 20000
+
+HIGHER_IS_BETTER = 'higher'
+LOWER_IS_BETTER  = 'lower'
+
+METRICS = {
+    'preprocess.frames_per_s':        HIGHER_IS_BETTER,
+    'cache_load.open_ms':             LOWER_IS_BETTER,
+    'cache_load.read_all_ms':         LOWER_IS_BETTER,
+    'cache_load.peak_memory_kb':      LOWER_IS_BETTER,
+    'display.frames_per_s':           HIGHER_IS_BETTER,
+    'display.overlay_frames_per_s':   HIGHER_IS_BETTER,
+    'display.overlay_update_bytes':   LOWER_IS_BETTER,
+    'display.spi_frames_per_s':       HIGHER_IS_BETTER,
+    'display.writer_frames_per_s':    HIGHER_IS_BETTER,
+    'transition.crossfade_ms':        LOWER_IS_BETTER,
+    'transition.wipe_ms':             LOWER_IS_BETTER,
+    'led.parse_ms':                   LOWER_IS_BETTER,
+    'led.step_us':                    LOWER_IS_BETTER,
+}
+
+
+class MockSpiDisplay(Display):
+    ''' Copies frames into a buffer instead of sending them. Set spi_hz to also
+        simulate the time the transfer would take on the bus. '''
+
+    def __init__(self, spi_hz: int = None) -> None:
+        super().__init__(PANEL_WIDTH, PANEL_HEIGHT)
+        self._spi_hz    = spi_hz
+        self._sink      = bytearray(FRAME_SIZE)
+        self.bytes_sent = 0
+
+    def show_raw(self, data: bytes) -> None:
+        self._sink[:len(data)] = data
+        self._transfer(len(data))
+
+    def show_region(self, x: int, y: int, pixels: np.ndarray) -> None:
+        data = pixels.tobytes()
+        self._sink[:len(data)] = data
+        self._transfer(len(data))
+
+    def _transfer(self, nbytes: int) -> None:
+        self.bytes_sent += nbytes
+        if self._spi_hz:
+            time.sleep(nbytes * 8 / self._spi_hz)
+
+
+class MockPixels(list):
+    ''' Stands in for neopixel.NeoPixel. '''
+
+    def fill(self, color) -> None:
+        self[:] = [color] * len(self)
+
+
+class MockLed(Led):
+
+    def __init__(self) -> None:
+        self._leds = MockPixels([(0, 0, 0)] * 4)
+
+
+def make_video_fixture(directory: str) -> str:
+    ''' Writes a synthetic video as ffmpeg would, returns the image dir. '''
+    image_dir = Path(directory, 'images')
+    image_dir.mkdir()
+
+    width, height = FIXTURE_SIZE
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, width, dtype=np.uint8)[None, :, None].repeat(height, 0).repeat(3, 2)
+
+    for i in range(FIXTURE_FRAMES):
+        # Moving block and noise, so frames don't compress to nothing
+        frame = gradient.copy()
+        x = (i * 7) % (width - 80)
+        frame[100:180, x:x + 80] = (255, 64, 0)
+        frame ^= rng.integers(0, 32, frame.shape, dtype=np.uint8)
+        Image.fromarray(frame).save(image_dir.joinpath(f'image-{i + 1:04d}.jpg'), quality=85)
+
+    return str(image_dir)
+
+
+@contextlib.contextmanager
+def quiet():
+    ''' The players print progress, which would drown the results. '''
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def bench_preprocess(player: VideoPlayer) -> Dict[str, float]:
+    t0 = time.perf_counter()
+    with quiet():
+        player.pickle()
+    dt = time.perf_counter() - t0
+    return {'frames_per_s': FIXTURE_FRAMES / dt}
+
+
+def bench_cache_load(player: VideoPlayer) -> Dict[str, float]:
+    tracemalloc.start()
+
+    t0 = time.perf_counter()
+    with quiet():
+        frames = player._get_frames()
+    t1 = time.perf_counter()
+    # What playback does with each frame
+    for frame in frames:
+        frame.tobytes()
+    t2 = time.perf_counter()
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'open_ms':        (t1 - t0) * 1000,
+        'read_all_ms':    (t2 - t1) * 1000,
+        'peak_memory_kb': peak / 1024,
+        'cache_size_kb':  os.path.getsize(player._get_cache_path()) / 1024,
+    }
+
+
+def bench_display(player: VideoPlayer) -> Dict[str, float]:
+    with quiet():
+        frames = player._get_frames()
+    display = MockSpiDisplay()
+    overlays = Compositor()
+
+    def run(display: Display, nbr_of_frames: int = DISPLAY_FRAMES) -> float:
+        t0 = time.perf_counter()
+        for i in range(nbr_of_frames):
+            display.show_frame(overlays.composite(frames[i % len(frames)]))
+        if isinstance(display, DisplayWriter):
+            display.flush()
+        return nbr_of_frames / (time.perf_counter() - t0)
+
+    results = {'frames_per_s': run(display)}
+
+    overlay = Overlay('HOME 0 - 0 AWAY', 4, 4)
+    overlays.set_overlay('score', overlay)
+    results['overlay_frames_per_s'] = run(display)
+
+    # Sending on the player's thread, against overlapping it with the next frame
+    results['spi_frames_per_s'] = run(MockSpiDisplay(SPI_HZ), SPI_FRAMES)
+    writer = DisplayWriter(MockSpiDisplay(SPI_HZ))
+    results['writer_frames_per_s'] = run(writer, SPI_FRAMES)
+    writer.close()
+
+    # What a score change costs on the bus when nothing else is playing
+    overlay.set_text('HOME 1 - 0 AWAY')
+    before = display.bytes_sent
+    display.show_region(overlay.region.x, overlay.region.y, overlay.region.pixels)
+    results['overlay_update_bytes'] = display.bytes_sent - before
+
+    return results
+
+
+def bench_transition(player: VideoPlayer) -> Dict[str, float]:
+    with quiet():
+        frames = player._get_frames()
+
+    results = {}
+    for name, effect in (('crossfade', crossfade), ('wipe', wipe)):
+        t0 = time.perf_counter()
+        for i in range(TRANSITION_FRAMES):
+            effect(frames[i % len(frames)], frames[-1 - i % len(frames)], i / TRANSITION_FRAMES)
+        results[f'{name}_ms'] = (time.perf_counter() - t0) / TRANSITION_FRAMES * 1000
+
+    return results
+
+
+def bench_led() -> Dict[str, float]:
+    led_player = LedPlayer(MockLed())
+
+    t0 = time.perf_counter()
+    led_states = led_player._parse_led_states(DEFAULT_LED_CSV)
+    t1 = time.perf_counter()
+    for i in range(LED_STEPS):
+        led_player._apply(led_states[i % len(led_states)])
+    t2 = time.perf_counter()
+
+    return {
+        'parse_ms': (t1 - t0) * 1000,
+        'step_us':  (t2 - t1) / LED_STEPS * 1e6,
+    }
+
+
+def run_benchmarks() -> Dict[str, Dict[str, float]]:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        image_dir = make_video_fixture(directory)
+        with quiet():
+            player = VideoPlayer(FIXTURE_FPS, image_dir, display=MockSpiDisplay())
+
+        results['preprocess'] = bench_preprocess(player)
+        results['cache_load'] = bench_cache_load(player)
+        results['display']    = bench_display(player)
+        results['transition'] = bench_transition(player)
+
+    results['led'] = bench_led()
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> bool:
+    ''' Prints every metric next to its baseline. Returns False on regressions. '''
+    ok = True
+    for metric, direction in METRICS.items():
+        group, name = metric.split('.')
+        value = results[group][name]
+        base = baseline.get(group, {}).get(name)
+
+        if base is None:
+            print(f'{metric:32} {value:12.2f}')
+            continue
+
+        change = (value - base) / base if base else 0.0
+        worse = -change if direction == HIGHER_IS_BETTER else change
+        regressed = worse > tolerance
+        ok = ok and not regressed
+
+        status = 'REGRESSION' if regressed else ''
+        print(f'{metric:32} {value:12.2f} {base:12.2f} {change * 100:+7.1f}% {status}')
+
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default=OUTPUT_PATH, help='Where to write the results as JSON')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline to compare against')
+    parser.add_argument('--update-baseline', action='store_true', help='Store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Allowed relative slowdown before failing (default: %(default)s)')
+    args = parser.parse_args()
+
+    report = {
+        'machine':   platform.machine(),
+        'python':    platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results':   run_benchmarks(),
+    }
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f'Saved baseline to {args.baseline}')
+
+    baseline = {}
+    same_machine = True
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        if stored['machine'] != report['machine']:
+            print(f'Baseline is from {stored["machine"]}, this is {report["machine"]}, comparison is only a hint')
+            same_machine = False
+        baseline = stored['results']
+    else:
+        print(f'No baseline at {args.baseline}, run with --update-baseline to store one')
+
+    print(f'{"metric":32} {"value":>12} {"baseline":>12} {"change":>8}')
+    ok = compare(report['results'], baseline, args.tolerance)
+    # Timings from another machine can't fail the run
+    return 0 if ok or not same_machine else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+''' Streaming audio playback.
+
+Audio is streamed from disk by pygame.mixer.music in small buffers, instead
+of being decoded into memory up front. Uploads are transcoded to the format
+the mixer is opened with (see FFMPEG_AUDIO_ARGS), so nothing is resampled
+while playing.
+'''
+import os
+import time
+from threading import Event, Lock
+from typing import List, Optional
+
+
+# Output format, the mixer is opened once with these settings
+AUDIO_FREQUENCY = 44100
+AUDIO_SIZE      = -16  # Signed 16 bit samples
+AUDIO_CHANNELS  = 2
+# Samples per mixer buffer. Smaller means lower latency, but risks underruns.
+AUDIO_BUFFER    = 512
+BUFFER_DURATION = AUDIO_BUFFER / AUDIO_FREQUENCY
+
+# ffmpeg output options that match the mixer format
+FFMPEG_AUDIO_ARGS = ['-vn', '-ar', str(AUDIO_FREQUENCY), '-ac', str(AUDIO_CHANNELS), '-c:a', 'pcm_s16le']
+
+# How often start() checks if playback has finished
+POLL_INTERVAL = 0.05
+
+LOOP_FOREVER = -1
+
+
+def init_mixer() -> None:
+    ''' Opens the mixer, if it isn't already. Slow, so call it early. '''
+    # pygame is slow to import, see play_video_server.py
+    import pygame
+
+    if pygame.mixer.get_init() is None:
+        print('Initializing pygame mixer')
+        pygame.mixer.init(frequency=AUDIO_FREQUENCY, size=AUDIO_SIZE,
+                          channels=AUDIO_CHANNELS, buffer=AUDIO_BUFFER)
+
+
+def ffmpeg_audio_command(video_path: str, audio_path: str) -> List[str]:
+    return ['ffmpeg', '-y', '-i', str(video_path)] + FFMPEG_AUDIO_ARGS + [str(audio_path)]
+
+
+class AudioPlayer:
+    ''' Plays one audio file. pygame has a single music stream, so only one
+        AudioPlayer can play at a time. '''
+
+    def __init__(self, audio_path: str, loops: int = 0) -> None:
+        self._audio_path = audio_path
+        self._loops      = loops
+        self._playing    = Event()
+        # Set once the mixer is playing
+        self._started    = Event()
+        # Guards the mixer and the position bookkeeping against seek()
+        self._lock       = Lock()
+
+        # Position bookkeeping, see position(). Playback starts at
+        # _start_offset, which seek() moves.
+        self._start_offset  = 0.0
+        self._last_pos      = None
+        self._last_pos_time = 0.0
+
+        if audio_path is None:
+            print('Audio path is None, not playing any audio!')
+            return
+
+        if not os.path.exists(audio_path):
+            print(f'Audio file {audio_path} doesnt exists!')
+            self._audio_path = None
+            return
+
+        try:
+            init_mixer()
+        except Exception as e:
+            # No sound card shouldn't stop the video from playing
+            print(f'Failed to initialize mixer, not playing any audio: {e}')
+            self._audio_path = None
+            return
+
+        print(f'Audio path: {audio_path}')
+
+    def has_audio(self) -> bool:
+        return self._audio_path is not None
+
+    def prepare(self) -> None:
+        ''' Audio is streamed, but have the kernel read the file in ahead of time. '''
+        if self._audio_path is None:
+            return
+
+        with open(self._audio_path, 'rb') as f:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+
+    def start(self) -> None:
+        ''' Plays until the audio ends or stop() is called. '''
+        if self._audio_path is None:
+            return
+
+        if self.is_playing():
+            print('Audio already playing!')
+            return
+
+        import pygame
+
+        print('Audio starting')
+        # Set before loading, so a stop() while loading isn't lost
+        self._playing.set()
+        pygame.mixer.music.load(str(self._audio_path))
+        with self._lock:
+            if self.is_playing():
+                self._play(self._start_offset)
+                self._started.set()
+
+        while self.is_playing() and pygame.mixer.music.get_busy():
+            time.sleep(POLL_INTERVAL)
+
+        print('Audio stopping')
+        pygame.mixer.music.stop()
+        pygame.mixer.music.unload()
+        self._started.clear()
+        self._playing.clear()
+
+    def stop(self) -> None:
+        if self._audio_path is None:
+            return
+
+        if not self.is_playing():
+            print('Audio player not playing!')
+
+        self._playing.clear()
+
+    def is_playing(self) -> bool:
+        return self._playing.is_set()
+
+    def wait_started(self, timeout: float) -> bool:
+        ''' Waits for the audio to be heard. Returns False on timeout. '''
+        return self._started.wait(timeout)
+
+    def seek(self, position: float) -> None:
+        ''' Jumps to position, in seconds. May be called before start(). '''
+        if self._audio_path is None:
+            return
+
+        with self._lock:
+            self._start_offset = position
+            if self._started.is_set():
+                self._play(position)
+
+    def _play(self, position: float) -> None:
+        ''' Call with _lock held. '''
+        import pygame
+
+        self._last_pos = None
+        try:
+            if position > 0:
+                pygame.mixer.music.play(self._loops, start=position)
+                return
+        except pygame.error as e:
+            # Not every format can be started part way through
+            print(f'Failed to seek audio to {position:.2f} s: {e}')
+        self._start_offset = 0.0
+        pygame.mixer.music.play(self._loops)
+
+    def position(self) -> Optional[float]:
+        ''' Seconds of audio that have been heard, or None if not playing. '''
+        if not self.is_playing():
+            return None
+
+        import pygame
+
+        with self._lock:
+            # Counts from the last play(), so from _start_offset
+            pos = pygame.mixer.music.get_pos()
+            if pos < 0:
+                return None
+
+            now = time.monotonic()
+            pos /= 1000
+            if pos != self._last_pos:
+                self._last_pos = pos
+                self._last_pos_time = now
+
+            # get_pos() only moves once per mixer buffer, so interpolate between
+            # updates. It also counts samples handed to the sound card, which are
+            # heard one buffer later.
+            pos = self._last_pos + min(now - self._last_pos_time, BUFFER_DURATION)
+            return self._start_offset + max(0.0, pos - BUFFER_DURATION)
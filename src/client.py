@@ -1,6 +1,14 @@
 import socket
 import traceback
 import logging
+import itertools
+import json
+import threading
+from contextlib import contextmanager
+from typing import List, Optional
+
+import protocol
+from protocol import Command, Result
 
 
 SERVER_IP   = '127.0.0.1'
@@ -11,8 +19,16 @@ logger = logging.getLogger(__name__)
 
 class Client:
 
-    def __init__(self) -> None:
+    def __init__(self, ip: str = SERVER_IP, port: int = SERVER_PORT, timeout: float = None) -> None:
+        self._address = (ip, port)
+        self._timeout = timeout
         self._sock: socket.socket = None
+        self._request_ids = itertools.count(1)
+        # One client may be shared between threads (the webapp does), each
+        # request and its reply must go over the socket in one piece
+        self._lock = threading.Lock()
+        # Commands collected while inside a batch() block, per thread
+        self._local = threading.local()
 
     def __enter__(self) -> 'Client':
         self.connect()
@@ -30,40 +46,140 @@ class Client:
         try:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            sock.connect((SERVER_IP, SERVER_PORT))
+            sock.settimeout(self._timeout)
+            sock.connect(self._address)
             self._sock = sock
             return True
         except Exception as e:
             logger.info(traceback.format_exc())
             return False
 
-    def _send(self, msg: str) -> None:
+    def _send(self, commands: List[Command]) -> Optional[List[Result]]:
+        with self._lock:
+            try:
+                return self._exchange(commands)
+            except (protocol.ProtocolError, OSError):
+                # Whatever is left on the socket can't be trusted
+                self.disconnect()
+                raise
+
+    def _exchange(self, commands: List[Command]) -> Optional[List[Result]]:
         if self._sock is None:
             logger.info('Client must be connected first, trying to connect...')
             if not self.connect():
                 logger.info('Failed to connect!')
-                return
+                return None
+
+        request_id = next(self._request_ids) & 0xffffffff
+        self._sock.sendall(protocol.encode_request(request_id, commands))
+
+        frame = protocol.read_frame(self._sock)
+        if frame is None:
+            logger.info('Server closed the connection')
+            self.disconnect()
+            return None
+
+        kind, reply_id, payload = frame
+        if kind != protocol.KIND_REPLY or reply_id != request_id:
+            raise protocol.ProtocolError(f'Unexpected reply {reply_id} to request {request_id}')
+
+        results = protocol.decode_results(payload)
+        logger.info(f'TX: {commands}')
+        logger.info(f'RX: {results}')
+        return results
+
+    def send(self, commands: List[Command]) -> Optional[List[Result]]:
+        ''' Sends already built commands as one batch. '''
+        return self._send(commands)
+
+    def _command(self, command_name: str, **kwargs) -> Optional[List[Result]]:
+        command = Command(command_name, {key: value for key, value in kwargs.items() if value is not None})
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None:
+            batch.append(command)
+            return None
+        return self._send([command])
+
+    @contextmanager
+    def batch(self):
+        ''' Collects all commands issued inside the block and sends them as one
+            request. The server runs them in order, with no other command in
+            between, and stops at the first one that fails (earlier commands
+            are not undone):
+
+            with client.batch():
+                client.set_led('#ff0000')
+                client.play_video(image_dir, 30)
+                client.seek_video(120)
+        '''
+        if getattr(self._local, 'batch', None) is not None:
+            raise RuntimeError('Batches can not be nested')
+
+        self._local.batch = []
+        try:
+            yield self
+            commands = self._local.batch
+        finally:
+            self._local.batch = None
 
-        tx = msg.encode('utf-8')
-        self._sock.send(tx)
-        rx = self._sock.recv(1024).decode('utf-8')
-        logger.info(f'TX: {msg}')
-        logger.info(f'RX: {rx}')
+        if commands:
+            self._send(commands)
 
-    def play_video(self, image_dir: str, fps: int, audio_path: str = None) -> None:
-        cmd = f'PLAY_VIDEO image_dir={image_dir} fps={fps}'
-        if audio_path is not None:
-            cmd += f' audio={audio_path}'
-        self._send(cmd)
+    def play_video(self, image_dir: str, fps: int, audio_path: str = None,
+                   transition: str = None, transition_frames: int = None) -> None:
+        self._command('PLAY_VIDEO', image_dir=image_dir, fps=int(fps), audio=audio_path,
+                      transition=transition, transition_frames=transition_frames)
 
     def stop_video(self) -> None:
-        self._send('STOP_VIDEO')
+        self._command('STOP_VIDEO')
+
+    def seek_video(self, frame: int) -> None:
+        self._command('SEEK_VIDEO', frame=frame)
+
+    def play_live(self, fps: int, address: str = None) -> None:
+        self._command('PLAY_LIVE', fps=int(fps), address=address)
+
+    def stop_live(self) -> None:
+        self._command('STOP_LIVE')
+
+    def set_overlay(self, text: str, name: str = None, x: int = None, y: int = None,
+                    color: str = None, background: str = None) -> None:
+        self._command('SET_OVERLAY', text=text, name=name, x=x, y=y, color=color, background=background)
+
+    def clear_overlay(self, name: str = None) -> None:
+        self._command('CLEAR_OVERLAY', name=name)
 
     def play_audio(self, audio_path: str) -> None:
-        self._send(f'PLAY_AUDIO audio={audio_path}')
+        self._command('PLAY_AUDIO', audio=audio_path)
 
     def stop_audio(self) -> None:
-        self._send('STOP_AUDIO')
+        self._command('STOP_AUDIO')
 
     def set_led(self, color: str) -> None:
-        self._send(f'SET_LED color={color}')
+        self._command('SET_LED', color=color)
+
+    def schedule_add(self, start, image_dir: str, fps: int, audio_path: str = None,
+                     transition: str = None, led_csv: str = None) -> Optional[int]:
+        ''' start is a unix timestamp, "+SECONDS" from now or "HH:MM[:SS]".
+            Returns the id of the new entry. '''
+        results = self._command('SCHEDULE_ADD', start=start, image_dir=image_dir, fps=int(fps),
+                                audio=audio_path, transition=transition, led_csv=led_csv)
+        if results and results[0].status == protocol.STATUS_OK:
+            return int(results[0].msg)
+        return None
+
+    def schedule_remove(self, entry_id: int) -> None:
+        self._command('SCHEDULE_REMOVE', id=int(entry_id))
+
+    def schedule_clear(self) -> None:
+        self._command('SCHEDULE_CLEAR')
+
+    def schedule_list(self) -> List[dict]:
+        results = self._command('SCHEDULE_LIST')
+        if results and results[0].status == protocol.STATUS_OK:
+            return json.loads(results[0].msg)
+        return []
+
+    def status(self) -> Optional[str]:
+        results = self._command('STATUS')
+        return results[0].msg if results else None
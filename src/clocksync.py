@@ -0,0 +1,215 @@
+''' Clock sync between jumbotron units, so they can play in lockstep.
+
+One unit is the leader, whose monotonic clock is the shared clock. The
+followers ping it over UDP a couple of times per second, NTP style:
+
+    follower sends t0 -> leader receives at t1, replies at t2 -> follower receives at t3
+
+    offset = ((t1 - t0) + (t2 - t3)) / 2
+    delay  = (t3 - t0) - (t2 - t1)
+
+The samples with the lowest delay are the most accurate, so the offset is
+taken from the best of the last few samples. Pings also tell the leader
+which followers exist and which control port they listen on.
+'''
+import socket
+import struct
+import time
+from collections import deque, namedtuple
+from threading import Thread, Lock
+from typing import Dict, List, Optional, Tuple
+
+
+SYNC_PORT = 9997
+
+ROLE_STANDALONE = 'standalone'
+ROLE_LEADER     = 'leader'
+ROLE_FOLLOWER   = 'follower'
+
+MAGIC        = b'JTSY'
+SYNC_VERSION = 1
+TYPE_REQUEST = 0
+TYPE_REPLY   = 1
+
+# magic, version, type, follower control port, t0
+REQUEST = struct.Struct('>4sBBHd')
+# magic, version, type, follower control port, t0, t1, t2
+REPLY   = struct.Struct('>4sBBHddd')
+
+SYNC_INTERVAL    = 0.5
+SYNC_TIMEOUT     = 0.5
+# Samples kept, the one with the lowest delay wins
+SYNC_SAMPLES     = 8
+# Samples needed before the clock counts as synced
+SYNC_MIN_SAMPLES = 3
+# The offset is slewed at most this much per sample, unless it's off by
+# more than STEP_THRESHOLD, in which case it jumps
+MAX_SLEW         = 0.0005
+STEP_THRESHOLD   = 0.05
+# Followers that haven't pinged for this long are forgotten
+FOLLOWER_TIMEOUT = 5.0
+
+SyncSample = namedtuple('SyncSample', ['offset', 'delay'])
+
+
+class SyncClock:
+    ''' The shared clock of a standalone unit, which is just its own. '''
+
+    role = ROLE_STANDALONE
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def now(self) -> float:
+        return time.monotonic()
+
+    def is_synced(self) -> bool:
+        return True
+
+    def followers(self) -> List[Tuple[str, int]]:
+        return []
+
+    def status(self) -> str:
+        return self.role
+
+
+class ClockSyncLeader(SyncClock):
+    ''' Answers pings from followers and keeps track of them. '''
+
+    role = ROLE_LEADER
+
+    def __init__(self, ip: str = '0.0.0.0', port: int = SYNC_PORT) -> None:
+        self._address = (ip, port)
+        self._sock: socket.socket = None
+        self._running = False
+        self._lock = Lock()
+        # (ip, control port) -> last seen
+        self._followers: Dict[Tuple[str, int], float] = {}
+
+    def start(self) -> None:
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(self._address)
+        self._sock.settimeout(SYNC_TIMEOUT)
+        self._running = True
+        Thread(target=self._serve, daemon=True).start()
+        print(f'Clock sync leader started at {self._address[0]}:{self._address[1]}')
+
+    def stop(self) -> None:
+        self._running = False
+
+    def followers(self) -> List[Tuple[str, int]]:
+        now = time.monotonic()
+        with self._lock:
+            return [follower for follower, last_seen in self._followers.items()
+                    if now - last_seen < FOLLOWER_TIMEOUT]
+
+    def status(self) -> str:
+        followers = ', '.join(f'{ip}:{port}' for ip, port in self.followers())
+        return f'{self.role}, followers: {followers or "none"}'
+
+    def _serve(self) -> None:
+        while self._running:
+            try:
+                data, addr = self._sock.recvfrom(REQUEST.size)
+            except socket.timeout:
+                continue
+
+            t1 = time.monotonic()
+            if len(data) != REQUEST.size:
+                continue
+            magic, version, kind, control_port, t0 = REQUEST.unpack(data)
+            if magic != MAGIC or version != SYNC_VERSION or kind != TYPE_REQUEST:
+                continue
+
+            with self._lock:
+                if (addr[0], control_port) not in self._followers:
+                    print(f'Clock sync follower {addr[0]}:{control_port} joined')
+                self._followers[(addr[0], control_port)] = t1
+
+            reply = REPLY.pack(MAGIC, SYNC_VERSION, TYPE_REPLY, control_port, t0, t1, time.monotonic())
+            self._sock.sendto(reply, addr)
+
+
+class ClockSyncFollower(SyncClock):
+    ''' Pings the leader and follows its clock. '''
+
+    role = ROLE_FOLLOWER
+
+    def __init__(self, leader_ip: str, control_port: int, port: int = SYNC_PORT) -> None:
+        self._leader = (leader_ip, port)
+        self._control_port = control_port
+        self._running = False
+        self._samples = deque(maxlen=SYNC_SAMPLES)
+        self._nbr_of_samples = 0
+        self._offset = 0.0
+        self._delay = None
+
+    def start(self) -> None:
+        self._running = True
+        Thread(target=self._sync, daemon=True).start()
+        print(f'Clock sync following {self._leader[0]}:{self._leader[1]}')
+
+    def stop(self) -> None:
+        self._running = False
+
+    def now(self) -> float:
+        return time.monotonic() + self._offset
+
+    def is_synced(self) -> bool:
+        return self._nbr_of_samples >= SYNC_MIN_SAMPLES
+
+    def status(self) -> str:
+        if not self.is_synced():
+            return f'{self.role}, not synced'
+        return f'{self.role}, offset {self._offset * 1000:.3f} ms, delay {self._delay * 1000:.3f} ms'
+
+    def _sync(self) -> None:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.settimeout(SYNC_TIMEOUT)
+
+        while self._running:
+            sample = self._ping(sock)
+            if sample is not None:
+                self._add_sample(sample)
+            time.sleep(SYNC_INTERVAL)
+
+        sock.close()
+
+    def _ping(self, sock: socket.socket) -> Optional[SyncSample]:
+        t0 = time.monotonic()
+        try:
+            sock.sendto(REQUEST.pack(MAGIC, SYNC_VERSION, TYPE_REQUEST, self._control_port, t0), self._leader)
+            while True:
+                data = sock.recv(REPLY.size)
+                t3 = time.monotonic()
+                if len(data) != REPLY.size:
+                    continue
+                magic, version, kind, _, sent_t0, t1, t2 = REPLY.unpack(data)
+                # Ignore late replies to earlier pings
+                if magic == MAGIC and version == SYNC_VERSION and kind == TYPE_REPLY and sent_t0 == t0:
+                    break
+        except OSError:
+            # Timeouts included, leader might not be up yet
+            return None
+
+        return SyncSample(((t1 - t0) + (t2 - t3)) / 2, (t3 - t0) - (t2 - t1))
+
+    def _add_sample(self, sample: SyncSample) -> None:
+        self._samples.append(sample)
+        best = min(self._samples, key=lambda sample: sample.delay)
+        error = best.offset - self._offset
+
+        if self._nbr_of_samples == 0 or abs(error) > STEP_THRESHOLD:
+            if self._nbr_of_samples:
+                print(f'Clock sync: stepping clock by {error * 1000:.1f} ms')
+            self._offset = best.offset
+        else:
+            # Slew, so frame times don't jump
+            self._offset += max(-MAX_SLEW, min(MAX_SLEW, error))
+
+        self._delay = best.delay
+        self._nbr_of_samples += 1
@@ -1,9 +1,10 @@
-import digitalio
-import board
-from PIL import Image, ImageDraw
-from adafruit_rgb_display import st7735
 import sys
-import busio
+import traceback
+from threading import Thread, Condition
+
+# Free of numpy and PIL, so the boot frame can be shown before they're
+# imported, see play_video_server.py
+from panel import PANEL_ROTATION, PANEL_WIDTH, PANEL_HEIGHT
 
 
 class Display:
@@ -12,7 +13,19 @@ class Display:
         self.width = width
         self.height = height
 
-    def show_image(self, image: Image) -> None:
+    def show_image(self, image: 'Image') -> None:
+        pass
+
+    def show_frame(self, frame: 'np.ndarray') -> None:
+        ''' Shows a panel frame, see panel.py. '''
+        self.show_raw(frame.tobytes())
+
+    def show_raw(self, data: bytes) -> None:
+        ''' Shows a panel frame given as raw bytes. '''
+        pass
+
+    def show_region(self, x: int, y: int, pixels: 'np.ndarray') -> None:
+        ''' Updates only a rectangle of the panel, in panel coordinates. '''
         pass
 
 
@@ -20,6 +33,11 @@ class ST7735R_Display(Display):
     
     def __init__(self, width: int, height: int):
         super().__init__(width, height)
+        # Hardware modules only import on the Pi, so Display can be used elsewhere
+        import digitalio
+        import board
+        from adafruit_rgb_display import st7735
+
         # Configuration for CS and DC pins
         cs_pin    = digitalio.DigitalInOut(board.CE0)
         dc_pin    = digitalio.DigitalInOut(board.D24)
@@ -36,13 +54,91 @@ class ST7735R_Display(Display):
             dc=dc_pin,
             rst=reset_pin,
             baudrate=BAUDRATE,
-            rotation=270
+            rotation=PANEL_ROTATION
         )
 
-        self._image = Image.new("RGB", (self._disp.width, self._disp.height))
-        self._draw = ImageDraw.Draw(self._image)
-
-    def show_image(self, image: Image) -> None:
+    def show_image(self, image: 'Image') -> None:
         # Display image.
         self._disp.image(image)
-        
\ No newline at end of file
+
+    def show_raw(self, data: bytes) -> None:
+        # Frame is already RGB565 in panel orientation, write it straight to RAM
+        self._disp._block(0, 0, PANEL_WIDTH - 1, PANEL_HEIGHT - 1, data)
+
+    def show_region(self, x: int, y: int, pixels: 'np.ndarray') -> None:
+        height, width = pixels.shape
+        if not pixels.size:
+            return
+        self._disp._block(x, y, x + width - 1, y + height - 1, pixels.tobytes())
+
+
+class DisplayWriter(Display):
+    ''' Owns a display and writes to it on its own thread, so the next frame
+        is prepared while the current one is on the SPI bus.
+
+        Holds two frames: the one being sent and the next one. Writing blocks
+        while both are taken, so a frame takes as long as the slower of
+        preparing and sending it, instead of both. '''
+
+    def __init__(self, display: Display) -> None:
+        super().__init__(display.width, display.height)
+        self._display = display
+        self._pending = None
+        self._busy    = False
+        self._running = True
+        self._changed = Condition()
+        self._thread  = Thread(target=self._write, daemon=True)
+        self._thread.start()
+
+    def show_image(self, image: 'Image') -> None:
+        self._put(self._display.show_image, image)
+
+    def show_raw(self, data: bytes) -> None:
+        # show_frame() converts to bytes before getting here, on the caller's thread
+        self._put(self._display.show_raw, data)
+
+    def show_region(self, x: int, y: int, pixels: 'np.ndarray') -> None:
+        self._put(self._display.show_region, x, y, pixels)
+
+    def flush(self) -> None:
+        ''' Blocks until everything written so far is on the display. '''
+        with self._changed:
+            while self._pending is not None or self._busy:
+                self._changed.wait()
+
+    def close(self) -> None:
+        self.flush()
+        with self._changed:
+            self._running = False
+            self._changed.notify_all()
+        self._thread.join()
+
+    def _put(self, write, *args) -> None:
+        with self._changed:
+            while self._pending is not None:
+                self._changed.wait()
+            self._pending = (write, args)
+            self._changed.notify_all()
+
+    def _write(self) -> None:
+        while True:
+            with self._changed:
+                while self._pending is None and self._running:
+                    self._changed.wait()
+                if self._pending is None:
+                    return
+                write, args = self._pending
+                self._pending = None
+                self._busy = True
+                # Frees the slot, the caller can hand over the next frame
+                self._changed.notify_all()
+
+            try:
+                write(*args)
+            except Exception:
+                print('Failed to write to display:')
+                traceback.print_exc()
+
+            with self._changed:
+                self._busy = False
+                self._changed.notify_all()
@@ -0,0 +1,44 @@
+import time
+from typing import Callable
+
+
+class FrameClock:
+    ''' Maps frame numbers to deadlines, counted from a fixed epoch so that
+        timing errors don't accumulate from frame to frame. '''
+
+    def __init__(self, fps: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self._fps   = fps
+        self._clock = clock
+        self._epoch = None
+
+    @property
+    def fps(self) -> float:
+        return self._fps
+
+    @property
+    def epoch(self) -> float:
+        return self._epoch
+
+    def start(self, epoch: float = None) -> None:
+        ''' Frame 0 is due at epoch (default: now). '''
+        self._epoch = self._clock() if epoch is None else epoch
+
+    def now(self) -> float:
+        return self._clock()
+
+    def deadline(self, frame: int) -> float:
+        return self._epoch + frame / self._fps
+
+    def frame_at(self, t: float = None) -> int:
+        ''' Returns the frame that is due at time t (default: now). '''
+        if t is None:
+            t = self._clock()
+        return int((t - self._epoch) * self._fps)
+
+    def wait_for(self, frame: int) -> float:
+        ''' Sleeps until the deadline of frame. Returns how late we are (>= 0). '''
+        dt = self.deadline(frame) - self._clock()
+        if dt > 0:
+            time.sleep(dt)
+            return 0.0
+        return -dt
@@ -1,6 +1,4 @@
-import board
 from collections import namedtuple
-import neopixel
 from typing import Tuple
 import time
 
@@ -12,6 +10,9 @@ Color = namedtuple('Color', ['r', 'g', 'b'])
 class Led:
 
     def __init__(self) -> None:
+        # Hardware modules only import on the Pi
+        import board
+        import neopixel
         self._leds = neopixel.NeoPixel(board.D12, NBR_OF_LEDS)
 
     def set_color_single_led(self, led_nbr: int, color: str) -> None:
@@ -0,0 +1,228 @@
+import os
+import socket
+import sys
+from collections import deque
+from threading import Thread, Event, Lock
+from typing import Optional
+
+import numpy as np
+
+from display import Display, DisplayWriter, ST7735R_Display
+from frameclock import FrameClock
+from overlay import Compositor
+from panel import FRAME_SIZE, VIDEO_WIDTH, VIDEO_HEIGHT, frame_from_bytes
+
+
+# Either "tcp:HOST:PORT" or "unix:PATH"
+DEFAULT_LIVE_ADDRESS = 'tcp:0.0.0.0:9998'
+
+# Frames held in the jitter buffer. Playback starts once PRIME frames are
+# buffered, and the oldest frame is dropped when the buffer is full, so
+# latency stays around PRIME..CAPACITY frames.
+JITTER_BUFFER_CAPACITY = 3
+JITTER_BUFFER_PRIME    = 2
+
+# How often blocking socket calls wake up to check if we've been stopped
+SOCKET_TIMEOUT = 0.5
+
+
+class JitterBuffer:
+
+    def __init__(self, capacity: int = JITTER_BUFFER_CAPACITY,
+                 prime: int = JITTER_BUFFER_PRIME) -> None:
+        self._capacity = capacity
+        self._prime    = min(prime, capacity)
+        self._frames   = deque()
+        self._lock     = Lock()
+        self._primed   = False
+
+        self.dropped   = 0
+        self.underruns = 0
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def push(self, frame: np.ndarray) -> None:
+        with self._lock:
+            if len(self._frames) >= self._capacity:
+                # Backpressure, drop the oldest frame rather than add latency
+                self._frames.popleft()
+                self.dropped += 1
+
+            self._frames.append(frame)
+            if len(self._frames) >= self._prime:
+                self._primed = True
+
+    def pop(self) -> Optional[np.ndarray]:
+        ''' Returns the next frame, or None if there's nothing to show yet. '''
+        with self._lock:
+            if not self._primed:
+                return None
+
+            if not self._frames:
+                # Ran dry, wait until we've buffered up again
+                self._primed = False
+                self.underruns += 1
+                return None
+
+            return self._frames.popleft()
+
+    def skip(self) -> None:
+        ''' Drops the next frame, used when playback falls behind the clock. '''
+        if self.pop() is not None:
+            self.dropped += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._frames.clear()
+            self._primed = False
+
+
+class LivePlayer:
+    ''' Shows a continuous stream of raw panel frames (see panel.py) that are
+        pushed to a TCP or UNIX socket, e.g. from ffmpeg:
+
+        ffmpeg -re -i feed -vf "scale=160:128,transpose=1" -pix_fmt rgb565be -f rawvideo tcp://jumbotron:9998
+    '''
+
+    def __init__(self, fps: int, address: str = DEFAULT_LIVE_ADDRESS,
+                 display: Display = None, overlays: Compositor = None) -> None:
+        self._fps      = fps
+        self._address  = address
+        self._display  = display if display is not None else DisplayWriter(ST7735R_Display(VIDEO_WIDTH, VIDEO_HEIGHT))
+        self._overlays = overlays if overlays is not None else Compositor()
+        self._buffer   = JitterBuffer()
+        self._playing  = Event()
+        self._listener: socket.socket = None
+
+    def listen(self) -> None:
+        ''' Opens the address, so bad addresses can be reported before start()
+            is run on a thread. start() does this if it hasn't been done. '''
+        if self._listener is None:
+            self._listener = self._listen()
+
+    def start(self) -> None:
+        if self._playing.is_set():
+            print('Live player already playing!')
+            return
+
+        self._playing.set()
+        try:
+            self.listen()
+        except Exception:
+            self._playing.clear()
+            raise
+        listener, self._listener = self._listener, None
+
+        ingest_thread = Thread(target=self._ingest, args=(listener, ))
+        ingest_thread.start()
+
+        print(f'Live player starting, waiting for frames on {self._address}')
+
+        clock = FrameClock(self._fps)
+        clock.start()
+
+        tick        = 0
+        fps_counter = 0
+        t0          = clock.now()
+
+        while self._playing.is_set():
+            clock.wait_for(tick)
+
+            # If we fell behind, the frames for the ticks we missed are stale
+            due = clock.frame_at()
+            for _ in range(due - tick):
+                self._buffer.skip()
+            tick = max(tick, due)
+
+            frame = self._buffer.pop()
+            if frame is not None:
+                self._display.show_frame(self._overlays.composite(frame))
+                fps_counter += 1
+
+            tick += 1
+
+            now = clock.now()
+            if now - t0 > 1:
+                sys.stdout.write(f'\rFPS: {fps_counter}, buffered: {len(self._buffer)}, '
+                                 f'dropped: {self._buffer.dropped}, underruns: {self._buffer.underruns}\n')
+                t0 = now
+                fps_counter = 0
+
+        print('Live player ending')
+        ingest_thread.join()
+        listener.close()
+        self._cleanup_address()
+
+    def stop(self) -> None:
+        if not self._playing.is_set():
+            print('Live player not playing!')
+            return
+
+        self._playing.clear()
+
+    def is_playing(self) -> bool:
+        return self._playing.is_set()
+
+    def _listen(self) -> socket.socket:
+        kind, _, target = self._address.partition(':')
+
+        if kind == 'unix':
+            self._cleanup_address()
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(target)
+        elif kind == 'tcp':
+            host, _, port = target.rpartition(':')
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((host, int(port)))
+        else:
+            raise ValueError(f'Unknown live address {self._address}, expected tcp:HOST:PORT or unix:PATH')
+
+        listener.listen(1)
+        listener.settimeout(SOCKET_TIMEOUT)
+        return listener
+
+    def _cleanup_address(self) -> None:
+        kind, _, path = self._address.partition(':')
+        if kind == 'unix' and os.path.exists(path):
+            os.unlink(path)
+
+    def _ingest(self, listener: socket.socket) -> None:
+        while self._playing.is_set():
+            try:
+                con, addr = listener.accept()
+            except socket.timeout:
+                continue
+
+            print(f'Live feed connected {addr}')
+            con.settimeout(SOCKET_TIMEOUT)
+            with con:
+                self._receive_frames(con)
+
+            print('Live feed disconnected')
+            self._buffer.clear()
+
+    def _receive_frames(self, con: socket.socket) -> None:
+        frame    = bytearray(FRAME_SIZE)
+        view     = memoryview(frame)
+        received = 0
+
+        while self._playing.is_set():
+            try:
+                nbytes = con.recv_into(view[received:])
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+
+            if nbytes == 0:
+                return
+
+            received += nbytes
+            if received == FRAME_SIZE:
+                self._buffer.push(frame_from_bytes(frame))
+                # The buffer keeps a reference, so start on a fresh one
+                frame    = bytearray(FRAME_SIZE)
+                view     = memoryview(frame)
+                received = 0
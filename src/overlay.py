@@ -0,0 +1,203 @@
+''' Text overlays (scores, clocks, captions) composited onto panel frames.
+
+Glyphs are rasterised once into a GlyphAtlas, already rotated to panel
+orientation, so rendering a string is just stacking glyph masks and
+colouring them. Rendered overlays are cached until their text changes.
+'''
+from collections import namedtuple
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from panel import FRAME_DTYPE, PANEL_WIDTH, PANEL_HEIGHT, VIDEO_HEIGHT, rgb_to_rgb565
+
+
+# First and last character in the atlas, printable ASCII
+FIRST_CHAR = 32
+LAST_CHAR  = 126
+# Characters missing from the atlas are drawn as this one
+FALLBACK_CHAR = '?'
+
+# A rectangle in panel coordinates, plus pixels to write there. mask is None
+# for opaque regions, otherwise only pixels where mask is set are written.
+Region = namedtuple('Region', ['x', 'y', 'pixels', 'mask'])
+
+
+def hex_to_rgb565(color: str) -> int:
+    ''' Color is string, as hex. '''
+    color = color.split('#')[-1]
+    rgb = np.array([int(color[i:i+2], 16) for i in (0, 2, 4)], dtype=np.uint8)
+    return int(rgb_to_rgb565(rgb))
+
+
+class GlyphAtlas:
+    ''' Masks for every character, in panel orientation. In panel space, the
+        video's x axis runs down the rows, so a string is rendered by stacking
+        glyphs on top of each other. '''
+
+    def __init__(self, font_path: str = None, size: int = 10, scale: int = 1) -> None:
+        if font_path is None:
+            font = ImageFont.load_default()
+        else:
+            font = ImageFont.truetype(font_path, size)
+
+        chars = [chr(code) for code in range(FIRST_CHAR, LAST_CHAR + 1)]
+        # All glyphs share one cell height, so strings line up
+        height = font.getbbox(''.join(chars))[3]
+        self.height = height * scale
+        self._glyphs: Dict[str, np.ndarray] = {}
+
+        for char in chars:
+            width = max(1, int(np.ceil(font.getlength(char))))
+            image = Image.new('L', (width, height))
+            ImageDraw.Draw(image).text((0, 0), char, font=font, fill=255)
+
+            mask = np.asarray(image) > 127
+            if scale > 1:
+                mask = mask.repeat(scale, axis=0).repeat(scale, axis=1)
+
+            # Video orientation -> panel orientation (90 degrees clockwise)
+            self._glyphs[char] = np.ascontiguousarray(np.rot90(mask, k=-1))
+
+    def render(self, text: str) -> np.ndarray:
+        ''' Returns the mask for text, in panel orientation. '''
+        fallback = self._glyphs[FALLBACK_CHAR]
+        glyphs = [self._glyphs.get(char, fallback) for char in text] or [fallback[:0]]
+        return np.concatenate(glyphs, axis=0)
+
+
+_atlases: Dict[Tuple, GlyphAtlas] = {}
+
+
+def get_atlas(font_path: str = None, size: int = 10, scale: int = 1) -> GlyphAtlas:
+    ''' Atlases are expensive to build, so they are shared between overlays. '''
+    key = (font_path, size, scale)
+    if key not in _atlases:
+        _atlases[key] = GlyphAtlas(font_path, size, scale)
+    return _atlases[key]
+
+
+class Overlay:
+    ''' Text placed at (x, y) in video coordinates (top left corner). '''
+
+    def __init__(self, text: str, x: int = 0, y: int = 0, color: str = '#ffffff',
+                 background: Optional[str] = '#000000', atlas: GlyphAtlas = None) -> None:
+        self._atlas      = atlas if atlas is not None else get_atlas()
+        self._x          = x
+        self._y          = y
+        # As given, for restyling, see the properties below
+        self._style      = (color, background)
+        self._color      = hex_to_rgb565(color)
+        self._background = None if background is None else hex_to_rgb565(background)
+        self._text       = None
+        self._region: Region = None
+        self.set_text(text)
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    @property
+    def x(self) -> int:
+        return self._x
+
+    @property
+    def y(self) -> int:
+        return self._y
+
+    @property
+    def color(self) -> str:
+        return self._style[0]
+
+    @property
+    def background(self) -> Optional[str]:
+        return self._style[1]
+
+    def set_text(self, text: str) -> bool:
+        ''' Returns True if the text changed. '''
+        if text == self._text:
+            return False
+
+        self._text = text
+        self._region = self._render()
+        return True
+
+    @property
+    def region(self) -> Region:
+        return self._region
+
+    def _render(self) -> Region:
+        mask = self._atlas.render(self._text)
+        height, width = mask.shape  # Panel orientation
+
+        # Video (x, y) -> panel column VIDEO_HEIGHT - 1 - y, row x
+        px = VIDEO_HEIGHT - self._y - width
+        py = self._x
+
+        # Clip to the panel
+        mask = mask[max(0, -py):max(0, PANEL_HEIGHT - py), max(0, -px):max(0, PANEL_WIDTH - px)]
+        px, py = max(0, px), max(0, py)
+
+        if self._background is None:
+            pixels = np.full(mask.shape, self._color, dtype=FRAME_DTYPE)
+            return Region(px, py, pixels, mask)
+
+        pixels = np.where(mask, self._color, self._background).astype(FRAME_DTYPE)
+        return Region(px, py, pixels, None)
+
+
+class Compositor:
+    ''' Holds named overlays and paints them onto outgoing frames. Overlays may
+        be changed from any thread. '''
+
+    def __init__(self) -> None:
+        self._overlays: Dict[str, Overlay] = {}
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._overlays)
+
+    def set_overlay(self, name: str, overlay: Overlay) -> None:
+        with self._lock:
+            self._overlays[name] = overlay
+
+    def get_overlay(self, name: str) -> Optional[Overlay]:
+        return self._overlays.get(name)
+
+    def remove_overlay(self, name: str) -> Optional[Overlay]:
+        with self._lock:
+            return self._overlays.pop(name, None)
+
+    def composite(self, frame: np.ndarray) -> np.ndarray:
+        ''' Returns frame with all overlays painted on. frame itself is left
+            untouched, since it usually belongs to a cache. '''
+        if not self._overlays:
+            return frame
+
+        frame = frame.copy()
+        with self._lock:
+            for overlay in self._overlays.values():
+                paint_region(frame, overlay.region)
+        return frame
+
+
+def paint_region(frame: np.ndarray, region: Region) -> None:
+    height, width = region.pixels.shape
+    target = frame[region.y:region.y + height, region.x:region.x + width]
+    if region.mask is None:
+        target[:] = region.pixels
+    else:
+        target[region.mask] = region.pixels[region.mask]
+
+
+def opaque_pixels(region: Region) -> np.ndarray:
+    ''' Pixels for showing a region on its own, transparent pixels are black. '''
+    if region.mask is None:
+        return region.pixels
+    return np.where(region.mask, region.pixels, 0).astype(FRAME_DTYPE)
+
+
+def blank_pixels(region: Region) -> np.ndarray:
+    return np.zeros_like(region.pixels)
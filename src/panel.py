@@ -0,0 +1,69 @@
+''' Helpers for the panel frame format.
+
+A panel frame is exactly what is written to the display RAM: RGB565, big
+endian, in the panel's native (rotated) orientation. Frames are kept as
+numpy arrays of shape (PANEL_HEIGHT, PANEL_WIDTH) with dtype '>u2', so
+frame.tobytes() can go straight out on SPI.
+
+numpy and PIL are slow to import, so they're only imported by the helpers
+that need them. The constants are free to import, which the boot path relies
+on (see play_video_server.py).
+'''
+
+
+# Size of the video, as seen by the viewer
+VIDEO_WIDTH  = 160
+VIDEO_HEIGHT = 128
+
+# The panels are mounted rotated, native orientation is portrait
+PANEL_ROTATION = 270
+PANEL_WIDTH    = VIDEO_HEIGHT
+PANEL_HEIGHT   = VIDEO_WIDTH
+
+BYTES_PER_PIXEL = 2
+FRAME_SIZE      = PANEL_WIDTH * PANEL_HEIGHT * BYTES_PER_PIXEL
+# Accepted anywhere numpy takes a dtype
+FRAME_DTYPE     = '>u2'
+
+
+def rgb_to_rgb565(rgb: 'np.ndarray') -> 'np.ndarray':
+    ''' Packs an (..., 3) uint8 array into RGB565. '''
+    import numpy as np
+
+    rgb = rgb.astype(np.uint16)
+    color = ((rgb[..., 0] & 0xF8) << 8) | ((rgb[..., 1] & 0xFC) << 3) | (rgb[..., 2] >> 3)
+    return color.astype(FRAME_DTYPE)
+
+
+def image_to_frame(image: 'Image.Image') -> 'np.ndarray':
+    ''' Converts a PIL image (in video orientation) into a panel frame. '''
+    import numpy as np
+
+    if image.size != (VIDEO_WIDTH, VIDEO_HEIGHT):
+        image = image.resize((VIDEO_WIDTH, VIDEO_HEIGHT))
+    image = image.convert('RGB').rotate(PANEL_ROTATION, expand=True)
+    return rgb_to_rgb565(np.asarray(image))
+
+
+def frame_from_bytes(data: bytes) -> 'np.ndarray':
+    ''' Wraps raw panel-format bytes (FRAME_SIZE long) without copying. '''
+    import numpy as np
+
+    return np.frombuffer(data, dtype=FRAME_DTYPE).reshape(PANEL_HEIGHT, PANEL_WIDTH)
+
+
+def blank_frame(color: int = 0) -> 'np.ndarray':
+    import numpy as np
+
+    return np.full((PANEL_HEIGHT, PANEL_WIDTH), color, dtype=FRAME_DTYPE)
+
+
+def frame_to_image(frame: 'np.ndarray') -> 'Image.Image':
+    ''' Converts a panel frame back into a PIL image, in video orientation. '''
+    import numpy as np
+    from PIL import Image
+
+    color = frame.astype(np.uint16)
+    rgb = np.stack([(color >> 8) & 0xF8, (color >> 3) & 0xFC, (color << 3) & 0xF8], axis=-1)
+    # Undoes the rotation in image_to_frame()
+    return Image.fromarray(np.rot90(rgb.astype(np.uint8)))
@@ -1,13 +1,25 @@
+import time
+PROCESS_START = time.monotonic()
+
+import argparse
 import socket
 import sys
-from typing import List
-import time
-from threading import Thread
+import os
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+from queue import Queue
+from threading import Thread, Lock, Event
 from pathlib import Path
 
-# Hardware
-from videoplayer import VideoPlayer, AudioPlayer
-from led import Led
+import protocol
+from client import Client
+from clocksync import SyncClock, ClockSyncLeader, ClockSyncFollower, SYNC_PORT, \
+                      ROLE_STANDALONE, ROLE_LEADER, ROLE_FOLLOWER
+from protocol import Command, Result
+from scheduler import Scheduler
+
+# Hardware, pygame, PIL and numpy are slow to import and initialize, so they
+# are only imported once the socket is up, see _bring_up().
 
 
 IP   = '0.0.0.0'
@@ -17,111 +29,570 @@ DEFAULT_IMAGE_DIR = '.'
 DEFAULT_AUDIO     = 'audio.wav'
 DEFAULT_COLOR     = '#ffffff'
 
+DEFAULT_OVERLAY            = 'score'
+DEFAULT_OVERLAY_COLOR      = '#ffffff'
+DEFAULT_OVERLAY_BACKGROUND = '#000000'
+
+# Raw panel frame shown as soon as the display is up. Created on first boot.
+BOOT_FRAME_PATH = str(Path(__file__).absolute().parent.parent.joinpath('boot.raw'))
+BOOT_TEXT       = 'JUMBOTRON'
+
+# How long a command waits for the subsystem it needs during startup
+STARTUP_TIMEOUT = 30
+
+# Commands a leader passes on to its followers
+RELAYED_COMMANDS = ('PLAY_VIDEO', 'STOP_VIDEO', 'SEEK_VIDEO', 'SET_OVERLAY', 'CLEAR_OVERLAY')
+# Time followers get to receive and prepare a video before its first frame
+LOCKSTEP_START_DELAY = 0.5
+# Followers prepare a video before replying, which can take a while
+RELAY_TIMEOUT        = 10.0
+RELAY_ATTEMPTS       = 2
+
 
 class VideoPlayerServer:
 
-    def __init__(self) -> None:
+    def __init__(self, sync: SyncClock = None, headless: bool = False) -> None:
         self._sock: socket.socket = None
-        self._video_player: VideoPlayer = None
-        self._audio_player: AudioPlayer = None
-        self._leds = Led()
-        self._leds.set_color(DEFAULT_COLOR)
+        # Shared clock between units, see clocksync.py
+        self._sync = sync if sync is not None else SyncClock()
+        # No display, LEDs or sound card, for running several servers on one machine
+        self._headless = headless
+        self._video_player: 'VideoPlayer' = None
+        self._video_thread: Thread = None
+        self._audio_player: 'AudioPlayer' = None
+        self._audio_thread: Thread = None
+        self._live_player: 'LivePlayer' = None
+        self._live_thread: Thread = None
+        self._leds: 'Led' = None
+        self._display: 'Display' = None
+        self._overlays: 'Compositor' = None
+
+        # Subsystems are brought up in the background, see _bring_up()
+        self._display_ready = Event()
+        self._leds_ready    = Event()
+        self._players_ready = Event()
+        self._startup_times = []
+
+        # Held while a command (or a whole batch) executes
+        self._command_lock = Lock()
+
+        # Batches waiting to be relayed, per follower, see _relay()
+        self._relays: Dict[Tuple[str, int], Queue] = {}
+
+        # Counts requests to change what's on the panels, so a video that
+        # finishes converting only plays if nothing else was asked for since
+        self._video_requests = 0
+        # image_dir -> (request, kwargs) of videos converting in the background
+        self._conversions: Dict[str, Tuple[int, dict]] = {}
 
         self._command_handlers = {
             'PLAY_VIDEO': self._cmd_play_video,
             'STOP_VIDEO': self._cmd_stop_video,
+            'SEEK_VIDEO': self._cmd_seek_video,
+            'PLAY_LIVE':  self._cmd_play_live,
+            'STOP_LIVE':  self._cmd_stop_live,
             'PLAY_AUDIO': self._cmd_play_audio,
             'STOP_AUDIO': self._cmd_stop_audio,
-            'SET_LED':    self._cmd_set_led
+            'SET_LED':    self._cmd_set_led,
+            'SET_OVERLAY':   self._cmd_set_overlay,
+            'CLEAR_OVERLAY': self._cmd_clear_overlay,
+            'SCHEDULE_ADD':    self._cmd_schedule_add,
+            'SCHEDULE_REMOVE': self._cmd_schedule_remove,
+            'SCHEDULE_CLEAR':  self._cmd_schedule_clear,
+            'SCHEDULE_LIST':   self._cmd_schedule_list,
+            'STATUS':        self._cmd_status
         }
 
+        self._scheduler = Scheduler(self._prepare_entry, self._play_entry)
+
     def start(self, ip: str, port: int) -> None:
         self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self._sock.bind((ip, port))
         self._sock.listen()
+        self._startup_times.append(('socket', 0.0, time.monotonic() - PROCESS_START))
         print(f'Video server started at {ip}:{port}')
 
+        self._sync.start()
+        Thread(target=self._bring_up, daemon=True).start()
+        self._scheduler.start()
+
         while True:
             print('Waiting for new client...')
             con, addr = self._sock.accept()
             print(f'New connection from {addr}')
-            self._handle_connection(con, addr)
+            # Clients (like the webapp) keep their connection open, so each
+            # gets its own thread. Commands are serialized by _command_lock.
+            Thread(target=self._handle_connection, args=(con, addr), daemon=True).start()
 
     def _handle_connection(self, con: socket.socket, addr) -> None:
         con.setblocking(True)
         connected = True
         while connected:
             try:
-                msg = con.recv(1024)
+                # Binary frames always start with the protocol magic, which
+                # no text command does.
+                first = con.recv(1, socket.MSG_PEEK)
 
-                if not msg:
+                if not first:
                     connected = False
                     continue
 
-                msg = msg.decode('utf-8')
-                msg = msg.split(' ')
-                command = msg[0]
-
-                if len(msg) > 1:
-                    kwargs = [m.strip() for m in msg[1:]]
-                    keypairs = [keypair.split('=') for keypair in kwargs]
-                    kwargs = {keypair[0]: keypair[1] for keypair in keypairs}
+                if first == protocol.MAGIC[:1]:
+                    connected = self._handle_frame(con)
                 else:
-                    kwargs = {}
+                    self._handle_text(con, con.recv(1024))
+            except ConnectionResetError as e:
+                connected = False
+            except protocol.ProtocolError as e:
+                print(f'Protocol error from {addr}: {e}')
+                connected = False
+            except Exception:
+                # A bad client must never take the server down with it
+                print(f'Error handling {addr}:')
+                traceback.print_exc()
+                connected = False
 
-                if command not in self._command_handlers:
-                    err = f'Failed to recognize command {command}!\n'
-                    print(err)
-                    con.send(err.encode('utf-8'))
+        print(f'Connection to {addr} failed')
+        con.close()
+
+    def _handle_frame(self, con: socket.socket) -> bool:
+        frame = protocol.read_frame(con)
+        if frame is None:
+            return False
+
+        kind, request_id, payload = frame
+        if kind != protocol.KIND_REQUEST:
+            raise protocol.ProtocolError(f'Unexpected frame kind {kind}')
+
+        commands = protocol.decode_commands(payload)
+        results = self._execute(commands)
+        con.sendall(protocol.encode_reply(request_id, results))
+        return True
+
+    def _handle_text(self, con: socket.socket, msg: bytes) -> None:
+        ''' Legacy text protocol: "COMMAND key=value key=value" '''
+        msg = msg.decode('utf-8', errors='replace')
+        msg = msg.split()
+        command = msg[0] if msg else ''
+
+        # Values can't contain spaces in the text protocol
+        keypairs = [keypair.partition('=') for keypair in msg[1:]]
+        malformed = [key for key, separator, _ in keypairs if not separator]
+        if malformed:
+            err = f'{command} FAILED: malformed arguments {" ".join(malformed)}, expected key=value\n'
+            print(err)
+            con.send(err.encode('utf-8'))
+            return
+        kwargs = {key: value for key, _, value in keypairs}
+
+        if command not in self._command_handlers:
+            err = f'Failed to recognize command {command}!\n'
+            print(err)
+            con.send(err.encode('utf-8'))
+            return
+
+        Thread(target=self._execute, args=([Command(command, kwargs)], )).start()
+        con.send(f'{command} OK\n'.encode('utf-8'))
+
+    def _execute(self, commands: List[Command]) -> List[Result]:
+        ''' Executes a batch of commands in order, back-to-back. Unknown command
+            names are rejected up front, in which case nothing is run.
+            Otherwise the batch stops at the first command that fails: the
+            remaining ones are skipped, and the ones before it are not undone. '''
+        unknown = [command.name for command in commands if command.name not in self._command_handlers]
+        if unknown:
+            err = f'Failed to recognize command {", ".join(unknown)}!'
+            print(err)
+            return [Result(protocol.STATUS_ERROR, err) for _ in commands]
+
+        results = []
+        with self._command_lock:
+            # Under the lock, so followers get batches in the order they run here
+            if self._sync.role == ROLE_LEADER:
+                commands = self._lead(commands)
+
+            for command in commands:
+                if results and results[-1].status != protocol.STATUS_OK:
+                    results.append(Result(protocol.STATUS_SKIPPED, f'{command.name} SKIPPED'))
                     continue
 
                 # Call appropiate command handler
-                command_handler = self._command_handlers[command]
-                print(f'Command: {command} with kwargs: {kwargs}, command-handler: {command_handler.__name__}')
-                Thread(target=command_handler, args=(kwargs, )).start()
+                command_handler = self._command_handlers[command.name]
+                print(f'Command: {command.name} with kwargs: {command.kwargs}, command-handler: {command_handler.__name__}')
+                try:
+                    msg = command_handler(command.kwargs)
+                    results.append(Result(protocol.STATUS_OK, msg or f'{command.name} OK'))
+                except Exception as e:
+                    print(f'Command {command.name} failed: {e}')
+                    results.append(Result(protocol.STATUS_ERROR, f'{command.name} FAILED: {e}'))
+
+        return results
+
+    # -- Lockstep -- #
+    def _lead(self, commands: List[Command]) -> List[Command]:
+        ''' Stamps videos with a shared start time and seeks with the shared
+            time they happen at, and passes the commands that affect playback
+            on to the followers. '''
+        now = self._sync.now()
+        start_at = now + LOCKSTEP_START_DELAY
+        seek_at = now
+
+        stamped = []
+        for command in commands:
+            if command.name == 'PLAY_VIDEO':
+                command = Command(command.name, {'start_at': start_at, **command.kwargs})
+                # A seek after a play in the same batch applies from its first frame
+                seek_at = command.kwargs['start_at']
+            elif command.name == 'SEEK_VIDEO':
+                command = Command(command.name, {'at': seek_at, **command.kwargs})
+            stamped.append(command)
+        commands = stamped
+
+        self._relay([command for command in commands if command.name in RELAYED_COMMANDS])
+        return commands
+
+    def _relay(self, commands: List[Command]) -> None:
+        ''' Queues commands for every follower. Call with _command_lock held. '''
+        if not commands:
+            return
 
-                con.send(f'{command} OK\n'.encode('utf-8'))
-            except ConnectionResetError as e:
-                # Nothing to do..
-                pass
+        for follower in self._sync.followers():
+            if follower not in self._relays:
+                # One worker per follower, so a slow or dead one doesn't hold
+                # up the rest, and each gets its batches in order
+                self._relays[follower] = Queue()
+                Thread(target=self._relay_to, args=(follower, self._relays[follower]), daemon=True).start()
+            self._relays[follower].put(commands)
 
-        print(f'Connection to {addr} failed')
+    def _relay_to(self, follower: Tuple[str, int], batches: Queue) -> None:
+        ''' Sends batches to one follower, in order, over one connection. '''
+        ip, port = follower
+        client = Client(ip, port, RELAY_TIMEOUT)
+
+        while True:
+            commands = batches.get()
+            results = None
+            for _ in range(RELAY_ATTEMPTS):
+                try:
+                    results = client.send(commands)
+                except ConnectionError:
+                    # The connection went stale since the last batch (the
+                    # follower restarted), the client reconnects on the retry
+                    continue
+                except (OSError, protocol.ProtocolError) as e:
+                    print(f'Failed to relay to follower {ip}:{port}: {e}')
+                    break
+                if results is not None:
+                    break
+
+            if results is None:
+                print(f'Failed to relay to follower {ip}:{port}')
+                continue
+            for result in results:
+                if result.status != protocol.STATUS_OK:
+                    print(f'Follower {ip}:{port}: {result.msg}')
+
+    # -- Startup -- #
+    def _bring_up(self) -> None:
+        ''' Initializes the subsystems in order of how soon they're needed.
+            Commands that need a subsystem wait until it's ready. '''
+        self._startup_phase('display', self._init_display, self._display_ready)
+        self._startup_phase('leds', self._init_leds, self._leds_ready)
+        self._startup_phase('players', self._init_players, self._players_ready)
+        print(f'Startup complete: {self._startup_report()}')
+
+    def _startup_phase(self, name: str, init: Callable[[], None], ready: Event) -> None:
+        t0 = time.monotonic()
+        try:
+            init()
+        except Exception:
+            print(f'Failed to initialize {name}:')
+            traceback.print_exc()
+        finally:
+            # Set even on failure, so waiting commands fail instead of hang
+            ready.set()
+
+        t1 = time.monotonic()
+        self._startup_times.append((name, t1 - t0, t1 - PROCESS_START))
+        print(f'Startup: {name} took {(t1 - t0) * 1000:.0f} ms, '
+              f'ready {(t1 - PROCESS_START) * 1000:.0f} ms after start')
+
+    def _startup_report(self) -> str:
+        return ', '.join(f'{name} {duration * 1000:.0f}/{since_start * 1000:.0f} ms'
+                         for name, duration, since_start in self._startup_times)
+
+    def _init_display(self) -> None:
+        from display import Display, DisplayWriter, ST7735R_Display
+        from panel import VIDEO_WIDTH, VIDEO_HEIGHT, FRAME_SIZE
+
+        if self._headless:
+            self._display = Display(VIDEO_WIDTH, VIDEO_HEIGHT)
+            return
+
+        # Everything goes through the writer, which is the only thread touching SPI
+        display = DisplayWriter(ST7735R_Display(VIDEO_WIDTH, VIDEO_HEIGHT))
+
+        # Raw bytes, so nothing needs to be converted before it's shown
+        if os.path.exists(BOOT_FRAME_PATH):
+            with open(BOOT_FRAME_PATH, 'rb') as f:
+                boot_frame = f.read()
+            if len(boot_frame) == FRAME_SIZE:
+                display.show_raw(boot_frame)
+            else:
+                print(f'Boot frame {BOOT_FRAME_PATH} has the wrong size, ignoring it')
+
+        self._display = display
+
+    def _init_leds(self) -> None:
+        if self._headless:
+            return
+
+        from led import Led
+
+        leds = Led()
+        leds.set_color(DEFAULT_COLOR)
+        self._leds = leds
+
+    def _init_players(self) -> None:
+        # Importing is most of the work here, handlers import these again for free
+        import videoplayer
+        import liveplayer
+        from audio import init_mixer
+        from overlay import Compositor
+
+        self._overlays = Compositor()
+
+        # Opened once here, so playing audio doesn't pay for it. Without a
+        # working sound card, videos play without audio.
+        if not self._headless:
+            try:
+                init_mixer()
+            except Exception as e:
+                print(f'Failed to initialize mixer, playing without audio: {e}')
+
+        if not os.path.exists(BOOT_FRAME_PATH):
+            self._write_boot_frame()
+
+    def _write_boot_frame(self) -> None:
+        from overlay import Overlay, get_atlas, paint_region
+        from panel import VIDEO_WIDTH, VIDEO_HEIGHT, blank_frame
+
+        rows, columns = get_atlas().render(BOOT_TEXT).shape
+        overlay = Overlay(BOOT_TEXT, (VIDEO_WIDTH - rows) // 2, (VIDEO_HEIGHT - columns) // 2)
+
+        frame = blank_frame()
+        paint_region(frame, overlay.region)
+        with open(BOOT_FRAME_PATH, 'wb') as f:
+            f.write(frame.tobytes())
+        print(f'Saved boot frame to {BOOT_FRAME_PATH}')
+
+        # There was nothing to show when the display came up
+        if self._display is not None:
+            self._display.show_frame(frame)
+
+    def _wait_for(self, ready: Event, attribute: str):
+        ''' Blocks until a subsystem is initialized and returns it, raises if it failed. '''
+        ready.wait(STARTUP_TIMEOUT)
+        subsystem = getattr(self, attribute)
+        if subsystem is None:
+            raise RuntimeError(f'{attribute.strip("_")} not available, see startup log')
+        return subsystem
 
     # -- Command handlers -- #
-    def _cmd_play_video(self, kwargs: dict) -> None:
-        if self._video_player is not None:
-            print('Video player already playing, stopping first...')
-            self._cmd_stop_video(kwargs)
+    def _cmd_play_video(self, kwargs: dict) -> Optional[str]:
+        self._wait_for(self._players_ready, '_overlays')
+        from transition import DEFAULT_TRANSITION_FRAMES
 
-        self._video_player = VideoPlayer(
+        effect = kwargs.get('transition')
+        self._check_transition(effect)
+        self._video_requests += 1
+
+        image_dir = kwargs.get('image_dir', DEFAULT_IMAGE_DIR)
+        video_player = self._create_video_player(
+            image_dir,
             int(kwargs.get('fps', 10)),
-            kwargs.get('image_dir', DEFAULT_IMAGE_DIR),
             kwargs.get('audio'),
-            self._leds
+            kwargs.get('led_csv')
         )
 
-        self._video_player.start()
+        if not video_player.has_frame_cache():
+            # Converting takes a while, don't hold up other commands meanwhile
+            converting = image_dir in self._conversions
+            self._conversions[image_dir] = (self._video_requests, kwargs)
+            if not converting:
+                Thread(target=self._convert, args=(video_player, image_dir), daemon=True).start()
+            return f'PLAY_VIDEO converting {image_dir}, it plays when done'
+
+        # Load the new video while the old one keeps playing
+        video_player.prepare()
+
+        # Set by the leader, in the shared clock
+        start_at = kwargs.get('start_at')
+        if start_at is not None:
+            start_at = float(start_at)
+            if not self._sync.is_synced():
+                print('Clock not synced yet, video will be out of step')
+
+        self._switch_video(video_player, effect, int(kwargs.get('transition_frames', DEFAULT_TRANSITION_FRAMES)),
+                           start_at)
+
+    def _convert(self, video_player: 'VideoPlayer', image_dir: str) -> None:
+        ''' Converts a video's frames, then plays it, unless something else
+            was asked for meanwhile. '''
+        try:
+            video_player.prepare()
+            converted = True
+        except Exception:
+            print(f'Failed to convert {image_dir}:')
+            traceback.print_exc()
+            converted = False
+
+        with self._command_lock:
+            request, kwargs = self._conversions.pop(image_dir)
+            if not converted:
+                return
+            if request != self._video_requests:
+                print(f'Converted {image_dir}, but something else was asked for since, not playing it')
+                return
+
+            try:
+                self._cmd_play_video(kwargs)
+            except Exception as e:
+                print(f'Failed to play {image_dir}: {e}')
+
+    def _create_video_player(self, image_dir: str, fps: int, audio: str = None,
+                             led_csv: str = None) -> 'VideoPlayer':
+        from videoplayer import VideoPlayer, DEFAULT_LED_CSV
+
+        return VideoPlayer(
+            fps,
+            image_dir,
+            # Headless servers share the machine, and its sound card
+            None if self._headless else audio,
+            self._leds,
+            display=self._display,
+            overlays=self._overlays,
+            led_csv=led_csv or DEFAULT_LED_CSV,
+            clock=self._sync.now,
+            lockstep=self._sync.role != ROLE_STANDALONE
+        )
+
+    def _check_transition(self, effect: str) -> None:
+        from transition import EFFECTS
+
+        if effect is not None and effect not in EFFECTS:
+            raise ValueError(f'Unknown transition {effect}, expected one of {", ".join(EFFECTS)}')
+
+    def _switch_video(self, video_player: 'VideoPlayer', effect: str = None,
+                      transition_frames: int = 0, start_time: float = None) -> None:
+        ''' Stops whatever is playing and starts video_player, which should
+            already be prepared. '''
+        from transition import Transition
+
+        if self._live_player is not None:
+            print('Live player playing, stopping first...')
+            self._cmd_stop_live({})
+
+        transition = None
+        if self._video_player is not None:
+            print('Video player already playing, stopping first...')
+            previous = self._video_player
+            self._cmd_stop_video({})
+
+            if effect is not None:
+                outgoing = previous.upcoming_frames(transition_frames)
+                if outgoing is not None:
+                    transition = Transition(effect, outgoing)
+
+        # There is a single audio stream, and the video's soundtrack takes it
+        if video_player.has_audio() and self._audio_player is not None:
+            print('Audio player playing, stopping first...')
+            self._cmd_stop_audio({})
+
+        self._video_player = video_player
+        self._video_thread = Thread(target=self._video_player.start, args=(transition, start_time))
+        self._video_thread.start()
 
     def _cmd_stop_video(self, kwargs: dict) -> None:
+        self._video_requests += 1
         if self._video_player is None:
             print('No video player active')
             return
 
         self._video_player.stop()
         # Wait for video player to finish
-        while self._video_player.is_playing():
-            time.sleep(.05)
+        self._video_thread.join()
 
         self._video_player = None
+        self._video_thread = None
+
+    def _cmd_seek_video(self, kwargs: dict) -> None:
+        if self._video_player is None:
+            raise RuntimeError('No video player active')
+
+        # Set by the leader, in the shared clock
+        at = kwargs.get('at')
+        self._video_player.seek(int(kwargs.get('frame', 0)), None if at is None else float(at))
+
+    def _cmd_play_live(self, kwargs: dict) -> None:
+        self._wait_for(self._players_ready, '_overlays')
+        self._video_requests += 1
+        from liveplayer import LivePlayer, DEFAULT_LIVE_ADDRESS
+
+        if self._live_player is not None:
+            print('Live player already playing, stopping first...')
+            self._cmd_stop_live(kwargs)
+        if self._video_player is not None:
+            print('Video player playing, stopping first...')
+            self._cmd_stop_video(kwargs)
+
+        self._live_player = LivePlayer(
+            int(kwargs.get('fps', 30)),
+            kwargs.get('address', DEFAULT_LIVE_ADDRESS),
+            display=self._display,
+            overlays=self._overlays
+        )
+        try:
+            # Here rather than on the player's thread, so a bad address fails the command
+            self._live_player.listen()
+        except Exception:
+            self._live_player = None
+            raise
+
+        self._live_thread = Thread(target=self._live_player.start)
+        self._live_thread.start()
+
+    def _cmd_stop_live(self, kwargs: dict) -> None:
+        if self._live_player is None:
+            print('No live player active')
+            return
+
+        self._live_player.stop()
+        # Wait for live player to finish
+        self._live_thread.join()
+
+        self._live_player = None
+        self._live_thread = None
 
     def _cmd_play_audio(self, kwargs: dict) -> None:
+        self._wait_for(self._players_ready, '_overlays')
+        from audio import AudioPlayer
+
+        if self._headless:
+            raise RuntimeError('No audio when headless')
+
+        # There is a single audio stream, see _switch_video()
+        if self._video_player is not None and self._video_player.has_audio():
+            raise RuntimeError('A video with audio is playing, stop it first')
+
         if self._audio_player is not None:
             print('Audio player already playing, stopping first...')
             self._cmd_stop_audio(kwargs)
 
         self._audio_player = AudioPlayer(kwargs.get('audio', DEFAULT_AUDIO))
-        self._audio_player.start()
+        self._audio_thread = Thread(target=self._audio_player.start)
+        self._audio_thread.start()
 
     def _cmd_stop_audio(self, kwargs: dict) -> None:
         if self._audio_player is None:
@@ -129,23 +600,161 @@ class VideoPlayerServer:
             return
 
         self._audio_player.stop()
-        # Wait for video player to finish
-        while self._audio_player.is_playing():
-            time.sleep(.05)
+        # Wait for audio player to finish
+        self._audio_thread.join()
 
         self._audio_player = None
+        self._audio_thread = None
 
     def _cmd_set_led(self, kwargs: dict) -> None:
-        self._leds.set_color(kwargs.get('color', DEFAULT_COLOR))
+        leds = self._wait_for(self._leds_ready, '_leds')
+        leds.set_color(kwargs.get('color', DEFAULT_COLOR))
+
+    def _cmd_set_overlay(self, kwargs: dict) -> None:
+        self._wait_for(self._players_ready, '_overlays')
+        from overlay import Overlay
+
+        name = kwargs.get('name', DEFAULT_OVERLAY)
+        text = str(kwargs.get('text', ''))
+        overlay = self._overlays.get_overlay(name)
+        old_region = overlay.region if overlay is not None else None
+
+        # Changing only the text reuses the overlay, anything else creates a
+        # new one, styled like the old one except for what was given
+        restyled = any(key in kwargs for key in ('x', 'y', 'color', 'background'))
+        if overlay is None or restyled:
+            if overlay is None:
+                style = {'x': 0, 'y': 0, 'color': DEFAULT_OVERLAY_COLOR, 'background': DEFAULT_OVERLAY_BACKGROUND}
+            else:
+                style = {'x': overlay.x, 'y': overlay.y, 'color': overlay.color, 'background': overlay.background}
+            style.update((key, kwargs[key]) for key in style if key in kwargs)
+
+            overlay = Overlay(
+                text,
+                int(style['x']),
+                int(style['y']),
+                style['color'],
+                style['background'] or None
+            )
+            self._overlays.set_overlay(name, overlay)
+        elif not overlay.set_text(text):
+            return
+
+        if not self._is_idle():
+            # Players composite the overlay onto their next frame
+            return
+
+        # Nothing is sending frames, so push just the overlay's rectangle
+        new_region = overlay.region
+        if old_region is not None and (old_region.x, old_region.y, old_region.pixels.shape) != \
+                                      (new_region.x, new_region.y, new_region.pixels.shape):
+            self._clear_region(old_region)
+        self._show_region(new_region)
+
+    def _cmd_clear_overlay(self, kwargs: dict) -> None:
+        self._wait_for(self._players_ready, '_overlays')
+        overlay = self._overlays.remove_overlay(kwargs.get('name', DEFAULT_OVERLAY))
+        if overlay is not None:
+            self._clear_region(overlay.region)
+
+    def _cmd_schedule_add(self, kwargs: dict) -> str:
+        from scheduler import parse_start
+
+        self._check_transition(kwargs.get('transition'))
+        entry = self._scheduler.add(
+            parse_start(kwargs['start']),
+            kwargs['image_dir'],
+            int(kwargs.get('fps', 10)),
+            kwargs.get('audio'),
+            kwargs.get('transition'),
+            kwargs.get('led_csv')
+        )
+        return str(entry.id)
+
+    def _cmd_schedule_remove(self, kwargs: dict) -> None:
+        if self._scheduler.remove(int(kwargs['id'])) is None:
+            raise KeyError(f'No schedule entry {kwargs["id"]}')
+
+    def _cmd_schedule_clear(self, kwargs: dict) -> None:
+        self._scheduler.clear()
+
+    def _cmd_schedule_list(self, kwargs: dict) -> str:
+        return self._scheduler.to_json()
+
+    # -- Schedule -- #
+    def _prepare_entry(self, entry: 'ScheduleEntry') -> 'VideoPlayer':
+        self._wait_for(self._players_ready, '_overlays')
+        video_player = self._create_video_player(entry.image_dir, entry.fps, entry.audio, entry.led_csv)
+        video_player.prepare()
+        return video_player
+
+    def _play_entry(self, entry: 'ScheduleEntry', video_player: 'VideoPlayer') -> None:
+        from transition import DEFAULT_TRANSITION_FRAMES
+
+        # Slots are wall clock times, players run on the shared clock
+        start_at = self._sync.now() + (entry.start - time.time())
+
+        with self._command_lock:
+            self._video_requests += 1
+            if self._sync.role == ROLE_LEADER:
+                # Followers prepare on receipt, so they may catch up by a few frames
+                kwargs = {'image_dir': entry.image_dir, 'fps': entry.fps, 'audio': entry.audio,
+                          'transition': entry.transition, 'led_csv': entry.led_csv, 'start_at': start_at}
+                self._relay([Command('PLAY_VIDEO', {key: value for key, value in kwargs.items() if value is not None})])
+
+            self._switch_video(video_player, entry.transition, DEFAULT_TRANSITION_FRAMES, start_at)
+
+    def _cmd_status(self, kwargs: dict) -> str:
+        return f'Startup: {self._startup_report()}; Sync: {self._sync.status()}'
+
+    def _is_idle(self) -> bool:
+        return self._video_player is None and self._live_player is None
+
+    def _show_region(self, region: 'Region') -> None:
+        from overlay import opaque_pixels
+        if self._display is not None:
+            self._display.show_region(region.x, region.y, opaque_pixels(region))
+
+    def _clear_region(self, region: 'Region') -> None:
+        from overlay import blank_pixels
+        if self._is_idle() and self._display is not None:
+            self._display.show_region(region.x, region.y, blank_pixels(region))
+
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Jumbotron video server')
+    parser.add_argument('--ip', default=IP, help='Address to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=PORT, help='Control port (default: %(default)s)')
+    parser.add_argument('--role', choices=(ROLE_STANDALONE, ROLE_LEADER, ROLE_FOLLOWER), default=ROLE_STANDALONE,
+                        help='Play on its own, or in lockstep with other units (default: %(default)s)')
+    parser.add_argument('--leader', help='Address of the leader, for followers')
+    parser.add_argument('--sync-port', type=int, default=SYNC_PORT, help='Clock sync UDP port (default: %(default)s)')
+    parser.add_argument('--headless', action='store_true', help='Run without display, LEDs and sound')
+    args = parser.parse_args()
+
+    if args.role == ROLE_FOLLOWER and args.leader is None:
+        parser.error('--leader is required for followers')
+    return args
+
 
+def create_sync(args: argparse.Namespace) -> SyncClock:
+    if args.role == ROLE_LEADER:
+        return ClockSyncLeader(args.ip, args.sync_port)
+    if args.role == ROLE_FOLLOWER:
+        return ClockSyncFollower(args.leader, args.port, args.sync_port)
+    return SyncClock()
 
 
 if __name__ == '__main__':
+    args = parse_args()
     try:
-        video_player_server = VideoPlayerServer()
-        video_player_server.start(IP, PORT)
+        video_player_server = VideoPlayerServer(create_sync(args), args.headless)
+        video_player_server.start(args.ip, args.port)
     finally:
-        import pygame
-        pygame.mixer.quit()
-        pygame.quit()
+        # pygame is only imported once the players have been brought up
+        if 'pygame' in sys.modules:
+            import pygame
+            pygame.mixer.quit()
+            pygame.quit()
 
@@ -0,0 +1,101 @@
+''' Thumbnails and preview strips for the web UI.
+
+Both are made from the frame cache, once per video, so browsing the library
+doesn't decode any JPEGs or touch the panels. The preview strip is a row of
+small frames sampled at PREVIEW_FPS.
+'''
+import os
+import tempfile
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Optional
+
+import numpy as np
+from PIL import Image
+
+from panel import VIDEO_WIDTH, VIDEO_HEIGHT, frame_to_image
+
+
+THUMBNAIL_NAME = 'thumbnail.png'
+PREVIEW_NAME   = 'preview.png'
+
+# Where in the video the thumbnail is taken, intros are often black
+THUMBNAIL_POSITION = 1 / 3
+
+PREVIEW_FPS    = 1
+PREVIEW_FRAMES = 12
+# Frames in the strip are this many times smaller than the video
+PREVIEW_SCALE  = 2
+
+
+# One lock per video directory, the webapp asks for both previews at once
+_locks: Dict[str, Lock] = {}
+_locks_lock = Lock()
+
+
+def make_thumbnail(frames: np.ndarray) -> Image.Image:
+    return frame_to_image(frames[int(len(frames) * THUMBNAIL_POSITION)])
+
+
+def make_preview_strip(frames: np.ndarray, fps: int) -> Image.Image:
+    step = max(1, round(fps / PREVIEW_FPS))
+    indices = np.arange(0, len(frames), step)
+    if len(indices) > PREVIEW_FRAMES:
+        # Long videos are spread over the strip instead of cut off
+        indices = indices[np.linspace(0, len(indices) - 1, PREVIEW_FRAMES).astype(int)]
+
+    width, height = VIDEO_WIDTH // PREVIEW_SCALE, VIDEO_HEIGHT // PREVIEW_SCALE
+    strip = Image.new('RGB', (width * len(indices), height))
+    for i, index in enumerate(indices):
+        strip.paste(frame_to_image(frames[index]).resize((width, height)), (i * width, 0))
+    return strip
+
+
+def write_previews(frames: np.ndarray, directory: str, fps: int) -> None:
+    ''' Writes the thumbnail and preview strip for a video into directory. '''
+    if not len(frames):
+        return
+    _save(make_thumbnail(frames), Path(directory, THUMBNAIL_NAME))
+    _save(make_preview_strip(frames, fps), Path(directory, PREVIEW_NAME))
+
+
+def get_preview(directory: str, name: str, fps: int) -> Optional[str]:
+    ''' Returns the path of a preview (THUMBNAIL_NAME or PREVIEW_NAME),
+        creating it if the frame cache is newer, or None if the video
+        hasn't been converted yet. '''
+    # videoplayer imports this module
+    from videoplayer import FRAME_CACHE_NAME
+
+    path = Path(directory, name)
+    cache_path = Path(directory, FRAME_CACHE_NAME)
+
+    if not cache_path.exists():
+        return str(path) if path.exists() else None
+
+    with _lock_for(directory):
+        if not path.exists() or path.stat().st_mtime < cache_path.stat().st_mtime:
+            write_previews(np.load(cache_path, mmap_mode='r'), directory, fps)
+
+    return str(path)
+
+
+def _lock_for(directory: str) -> Lock:
+    key = os.path.realpath(directory)
+    with _locks_lock:
+        if key not in _locks:
+            _locks[key] = Lock()
+        return _locks[key]
+
+
+def _save(image: Image.Image, path: Path) -> None:
+    # Written aside and moved in place, so the webapp never serves half a
+    # file. The name is unique, since the server may be converting too.
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp',
+                                     delete=False) as f:
+        tmp_path = f.name
+        try:
+            image.save(f, format='PNG')
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+    os.replace(tmp_path, path)
@@ -0,0 +1,225 @@
+''' Binary control protocol spoken between Client and VideoPlayerServer.
+
+Every message is a frame:
+
+    magic (2) | version (1) | kind (1) | request id (4) | payload length (4) | payload
+
+All integers are big endian. A request payload holds a batch of commands,
+each with a name and typed keyword arguments. A reply payload holds one
+result (status + message) per command, in the same order.
+'''
+import os
+import socket
+import struct
+from collections import namedtuple
+from typing import List, Optional, Tuple
+
+
+MAGIC            = b'\xa5J'
+PROTOCOL_VERSION = 1
+
+KIND_REQUEST = 0
+KIND_REPLY   = 1
+
+STATUS_OK      = 0
+STATUS_ERROR   = 1
+STATUS_SKIPPED = 2
+
+MAX_PAYLOAD_SIZE = 1 << 20
+
+# Argument type tags
+TYPE_NONE  = b'N'
+TYPE_BOOL  = b'?'
+TYPE_INT   = b'i'
+TYPE_FLOAT = b'f'
+TYPE_STR   = b's'
+TYPE_BYTES = b'b'
+
+HEADER = struct.Struct('>2sBBII')
+U8     = struct.Struct('>B')
+U16    = struct.Struct('>H')
+U32    = struct.Struct('>I')
+I64    = struct.Struct('>q')
+F64    = struct.Struct('>d')
+
+Command = namedtuple('Command', ['name', 'kwargs'])
+Result  = namedtuple('Result', ['status', 'msg'])
+
+
+class ProtocolError(Exception):
+    pass
+
+
+# -- Encoding -- #
+
+def _pack_count(fmt: struct.Struct, count: int, what: str) -> bytes:
+    if count >= 1 << (fmt.size * 8):
+        raise ProtocolError(f'Too many {what} ({count})')
+    return fmt.pack(count)
+
+
+def _pack_str(value: str) -> bytes:
+    data = value.encode('utf-8')
+    return _pack_count(U16, len(data), 'bytes in name or message') + data
+
+
+def _pack_value(value) -> bytes:
+    if isinstance(value, os.PathLike):
+        value = os.fspath(value)
+
+    # bool must be checked before int, since bool is a subclass of int
+    if value is None:
+        return TYPE_NONE
+    if isinstance(value, bool):
+        return TYPE_BOOL + U8.pack(value)
+    if isinstance(value, int):
+        if not -(1 << 63) <= value < 1 << 63:
+            raise ProtocolError(f'Integer {value} out of range')
+        return TYPE_INT + I64.pack(value)
+    if isinstance(value, float):
+        return TYPE_FLOAT + F64.pack(value)
+    if isinstance(value, str):
+        data = value.encode('utf-8')
+        return TYPE_STR + U32.pack(len(data)) + data
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return TYPE_BYTES + U32.pack(len(value)) + bytes(value)
+
+    raise ProtocolError(f'Unsupported argument type {type(value).__name__}')
+
+
+def _pack_frame(kind: int, request_id: int, payload: bytes) -> bytes:
+    if len(payload) > MAX_PAYLOAD_SIZE:
+        raise ProtocolError(f'Payload too large ({len(payload)} bytes)')
+    return HEADER.pack(MAGIC, PROTOCOL_VERSION, kind, request_id, len(payload)) + payload
+
+
+def encode_request(request_id: int, commands: List[Command]) -> bytes:
+    parts = [_pack_count(U16, len(commands), 'commands')]
+    for command in commands:
+        parts.append(_pack_str(command.name))
+        parts.append(_pack_count(U8, len(command.kwargs), 'arguments'))
+        for key, value in command.kwargs.items():
+            parts.append(_pack_str(key))
+            parts.append(_pack_value(value))
+
+    return _pack_frame(KIND_REQUEST, request_id, b''.join(parts))
+
+
+def encode_reply(request_id: int, results: List[Result]) -> bytes:
+    parts = [_pack_count(U16, len(results), 'results')]
+    for result in results:
+        parts.append(U8.pack(result.status))
+        parts.append(_pack_str(result.msg))
+
+    return _pack_frame(KIND_REPLY, request_id, b''.join(parts))
+
+
+# -- Decoding -- #
+
+class _Reader:
+
+    def __init__(self, data: bytes) -> None:
+        self._data = memoryview(data)
+        self._offset = 0
+
+    def take(self, size: int) -> bytes:
+        end = self._offset + size
+        if end > len(self._data):
+            raise ProtocolError('Truncated payload')
+        chunk = self._data[self._offset:end].tobytes()
+        self._offset = end
+        return chunk
+
+    def unpack(self, fmt: struct.Struct):
+        return fmt.unpack(self.take(fmt.size))[0]
+
+    def str(self) -> str:
+        return self._decode(self.take(self.unpack(U16)))
+
+    def value(self):
+        tag = self.take(1)
+        if tag == TYPE_NONE:
+            return None
+        if tag == TYPE_BOOL:
+            return bool(self.unpack(U8))
+        if tag == TYPE_INT:
+            return self.unpack(I64)
+        if tag == TYPE_FLOAT:
+            return self.unpack(F64)
+        if tag == TYPE_STR:
+            return self._decode(self.take(self.unpack(U32)))
+        if tag == TYPE_BYTES:
+            return self.take(self.unpack(U32))
+        raise ProtocolError(f'Unknown argument type {tag!r}')
+
+    def _decode(self, data: bytes) -> str:
+        try:
+            return data.decode('utf-8')
+        except UnicodeDecodeError as e:
+            raise ProtocolError(f'Invalid UTF-8 in payload: {e}')
+
+    def done(self) -> None:
+        if self._offset != len(self._data):
+            raise ProtocolError('Trailing bytes in payload')
+
+
+def decode_commands(payload: bytes) -> List[Command]:
+    reader = _Reader(payload)
+    commands = []
+    for _ in range(reader.unpack(U16)):
+        name = reader.str()
+        kwargs = {}
+        for _ in range(reader.unpack(U8)):
+            key = reader.str()
+            kwargs[key] = reader.value()
+        commands.append(Command(name, kwargs))
+
+    reader.done()
+    return commands
+
+
+def decode_results(payload: bytes) -> List[Result]:
+    reader = _Reader(payload)
+    results = []
+    for _ in range(reader.unpack(U16)):
+        status = reader.unpack(U8)
+        results.append(Result(status, reader.str()))
+
+    reader.done()
+    return results
+
+
+# -- Socket helpers -- #
+
+def recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    ''' Reads exactly size bytes. Returns None if the peer closed before the first byte. '''
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            if not buf:
+                return None
+            raise ConnectionResetError('Connection closed in the middle of a frame')
+        buf += chunk
+    return bytes(buf)
+
+
+def read_frame(sock: socket.socket) -> Optional[Tuple[int, int, bytes]]:
+    ''' Reads one frame and returns (kind, request_id, payload), or None on EOF. '''
+    header = recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+
+    magic, version, kind, request_id, length = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ProtocolError(f'Bad magic {magic!r}')
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f'Unsupported protocol version {version}')
+    if length > MAX_PAYLOAD_SIZE:
+        raise ProtocolError(f'Payload too large ({length} bytes)')
+
+    payload = recv_exact(sock, length) if length else b''
+    if payload is None:
+        raise ConnectionResetError('Connection closed in the middle of a frame')
+
+    return kind, request_id, payload
@@ -0,0 +1,172 @@
+''' Programmed content: a timeline of videos that start at set times.
+
+Each entry is prepared (frames loaded, audio and LED cues read) a while
+before its slot, so at the slot all that's left is to switch players. The
+new player's frame clock starts exactly at the slot time.
+'''
+import itertools
+import json
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from threading import Thread, Condition
+from typing import Any, Callable, Dict, List, Optional
+
+
+# How long before its slot an entry is prepared
+PRELOAD_AHEAD = 10.0
+# How long before its slot the old video is stopped, to have the new one
+# waiting for its first frame when the slot starts
+SWITCH_LEAD = 0.1
+# Entries this late are still played, later ones are skipped
+LATE_LIMIT = 1.0
+
+ScheduleEntry = namedtuple('ScheduleEntry', [
+    'id', 'start', 'image_dir', 'fps', 'audio', 'transition', 'led_csv'
+])
+
+
+def parse_start(value) -> float:
+    ''' Start times are either a unix timestamp, "+SECONDS" from now or
+        "HH:MM[:SS]" (the next time the clock shows that). Start times that
+        have already passed are rejected. '''
+    start = _parse_start(value)
+    if start < time.time() - LATE_LIMIT:
+        # Most likely a typo, like "19" for "19:00"
+        raise ValueError(f'Start {value} is in the past, expected a unix timestamp, +SECONDS or HH:MM[:SS]')
+    return start
+
+
+def _parse_start(value) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    value = str(value).strip()
+    if value.startswith('+'):
+        return time.time() + float(value[1:])
+
+    if ':' in value:
+        parts = [int(part) for part in value.split(':')]
+        hour, minute, second = (parts + [0])[:3]
+        now = datetime.now()
+        start = now.replace(hour=hour, minute=minute, second=second, microsecond=0)
+        if start < now:
+            start += timedelta(days=1)
+        return start.timestamp()
+
+    return float(value)
+
+
+class Scheduler:
+    ''' Runs on its own thread and calls prepare(entry) ahead of each slot
+        and play(entry, prepared) right before it, where prepared is whatever
+        prepare() returned. play() should start the video at entry.start. '''
+
+    def __init__(self, prepare: Callable[[ScheduleEntry], Any],
+                 play: Callable[[ScheduleEntry, Any], None]) -> None:
+        self._prepare  = prepare
+        self._play     = play
+        self._entries: Dict[int, ScheduleEntry] = {}
+        self._ids      = itertools.count(1)
+        self._changed  = Condition()
+        self._running  = False
+
+    def start(self) -> None:
+        self._running = True
+        Thread(target=self._run, daemon=True).start()
+
+    def stop(self) -> None:
+        with self._changed:
+            self._running = False
+            self._changed.notify_all()
+
+    def add(self, start: float, image_dir: str, fps: int, audio: str = None,
+            transition: str = None, led_csv: str = None) -> ScheduleEntry:
+        with self._changed:
+            # Only one video can play at a time
+            for other in self._entries.values():
+                if other.start == start:
+                    raise ValueError(f'Entry {other.id} already starts at {start}')
+            entry = ScheduleEntry(next(self._ids), start, image_dir, fps, audio, transition, led_csv)
+            self._entries[entry.id] = entry
+            self._changed.notify_all()
+        return entry
+
+    def remove(self, entry_id: int) -> Optional[ScheduleEntry]:
+        with self._changed:
+            entry = self._entries.pop(entry_id, None)
+            self._changed.notify_all()
+        return entry
+
+    def clear(self) -> None:
+        with self._changed:
+            self._entries.clear()
+            self._changed.notify_all()
+
+    def entries(self) -> List[ScheduleEntry]:
+        with self._changed:
+            self._prune()
+            return sorted(self._entries.values(), key=lambda entry: entry.start)
+
+    def to_json(self) -> str:
+        return json.dumps([entry._asdict() for entry in self.entries()])
+
+    def _next_entry(self) -> Optional[ScheduleEntry]:
+        ''' Earliest entry that hasn't been played and isn't too late. '''
+        self._prune()
+        return min(self._entries.values(), key=lambda entry: entry.start, default=None)
+
+    def _prune(self) -> None:
+        ''' Drops entries that are too late to be played. Entries that are
+            played are removed by _run. Call with _changed held. '''
+        now = time.time()
+        for entry in list(self._entries.values()):
+            if entry.start <= now - LATE_LIMIT:
+                del self._entries[entry.id]
+
+    def _wait_until(self, t: float, entry: ScheduleEntry = None) -> bool:
+        ''' Sleeps until t. Returns False if the schedule changed such that
+            entry is no longer next (or we were stopped). Call with _changed held. '''
+        while self._running:
+            if entry is not None and self._next_entry() != entry:
+                return False
+            dt = t - time.time()
+            if dt <= 0:
+                return True
+            self._changed.wait(dt)
+        return False
+
+    def _run(self) -> None:
+        while True:
+            with self._changed:
+                if not self._running:
+                    return
+
+                entry = self._next_entry()
+                if entry is None:
+                    self._changed.wait()
+                    continue
+
+                if not self._wait_until(entry.start - PRELOAD_AHEAD, entry):
+                    continue
+
+            print(f'Schedule: preparing entry {entry.id} ({entry.image_dir})')
+            try:
+                prepared = self._prepare(entry)
+            except Exception as e:
+                print(f'Schedule: failed to prepare entry {entry.id}: {e}')
+                with self._changed:
+                    self._entries.pop(entry.id, None)
+                continue
+
+            with self._changed:
+                if not self._wait_until(entry.start - SWITCH_LEAD, entry):
+                    print(f'Schedule: entry {entry.id} was changed, dropping it')
+                    continue
+                del self._entries[entry.id]
+
+            print(f'Schedule: switching to entry {entry.id}')
+            try:
+                self._play(entry, prepared)
+            except Exception as e:
+                print(f'Schedule: failed to play entry {entry.id}: {e}')
@@ -0,0 +1,125 @@
+''' Transitions between two videos, blended directly on panel frames.
+
+Blended frames are rendered on a separate thread a few frames ahead of when
+they are needed, so the player only has to pick them up.
+'''
+import traceback
+from threading import Thread, Condition
+from typing import Callable, Dict
+
+import numpy as np
+
+from panel import FRAME_DTYPE
+
+
+DEFAULT_TRANSITION_FRAMES = 15
+
+# Blended frames rendered ahead of the player
+TRANSITION_BUFFER = 4
+# How long the player waits for a blended frame before showing the incoming
+# frame as-is
+RENDER_TIMEOUT = 0.5
+
+# RGB565 spread out over 32 bits, as 00000GGGGGG00000RRRRR000000BBBBB, which
+# leaves room for each channel to be multiplied by a 5 bit alpha without
+# spilling into its neighbour.
+SPREAD_MASK = 0x07E0F81F
+ALPHA_BITS  = 5
+ALPHA_MAX   = 1 << ALPHA_BITS
+
+
+def _spread(frame: np.ndarray) -> np.ndarray:
+    color = frame.astype(np.uint32)
+    return (color | (color << 16)) & SPREAD_MASK
+
+
+def crossfade(outgoing: np.ndarray, incoming: np.ndarray, progress: float) -> np.ndarray:
+    ''' Blends all three channels at once, instead of unpacking them. '''
+    alpha = int(round(progress * ALPHA_MAX))
+    blended = (_spread(outgoing) * (ALPHA_MAX - alpha) + _spread(incoming) * alpha) >> ALPHA_BITS
+    blended &= SPREAD_MASK
+    return ((blended | (blended >> 16)) & 0xFFFF).astype(FRAME_DTYPE)
+
+
+def wipe(outgoing: np.ndarray, incoming: np.ndarray, progress: float) -> np.ndarray:
+    ''' Incoming video wipes in from the left. Panel rows are the video's x axis. '''
+    rows = int(round(progress * len(outgoing)))
+    frame = outgoing.copy()
+    frame[:rows] = incoming[:rows]
+    return frame
+
+
+EFFECTS: Dict[str, Callable[[np.ndarray, np.ndarray, float], np.ndarray]] = {
+    'crossfade': crossfade,
+    'wipe':      wipe,
+}
+
+
+class Transition:
+    ''' Blends the frames the outgoing video would have shown next into the
+        first frames of the incoming video. '''
+
+    def __init__(self, effect: str, outgoing: np.ndarray) -> None:
+        if effect not in EFFECTS:
+            raise ValueError(f'Unknown transition {effect}, expected one of {", ".join(EFFECTS)}')
+
+        self._effect   = EFFECTS[effect]
+        self._outgoing = outgoing
+        self._incoming: np.ndarray = None
+        # Rendered frames are kept by step, the player may ask for one twice
+        # when it follows the audio
+        self._rendered: Dict[int, np.ndarray] = {}
+        self._requested = 0
+        self._condition = Condition()
+        self._stopped  = False
+        # Set when the renderer is finished, or has failed
+        self._done     = False
+        self.length    = len(outgoing)
+
+    def start(self, incoming: np.ndarray) -> None:
+        ''' Starts rendering ahead. incoming are the frames of the new video. '''
+        self._incoming = incoming
+        self.length = min(self.length, len(incoming))
+        Thread(target=self._render, args=(incoming, ), daemon=True).start()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def frame(self, step: int) -> np.ndarray:
+        ''' Returns blended frame number step. If the renderer can't keep up
+            or has failed, the incoming frame is returned. '''
+        with self._condition:
+            self._requested = max(self._requested, step)
+            self._condition.notify_all()
+            self._condition.wait_for(lambda: step in self._rendered or self._done, RENDER_TIMEOUT)
+            frame = self._rendered.get(step)
+
+        if frame is None:
+            if not self._done:
+                print(f'Transition frame {step} not rendered in time, cutting to it')
+            return self._incoming[step]
+        return frame
+
+    def _render(self, incoming: np.ndarray) -> None:
+        try:
+            for step in range(self.length):
+                with self._condition:
+                    self._condition.wait_for(lambda: self._stopped or step < self._requested + TRANSITION_BUFFER)
+                    if self._stopped:
+                        return
+
+                progress = (step + 1) / (self.length + 1)
+                frame = self._effect(self._outgoing[step], incoming[step], progress)
+
+                with self._condition:
+                    self._rendered[step] = frame
+                    self._condition.notify_all()
+        except Exception:
+            print('Transition renderer failed:')
+            traceback.print_exc()
+        finally:
+            with self._condition:
+                self._done = True
+                self._condition.notify_all()
@@ -2,90 +2,178 @@ from collections import namedtuple
 from PIL import Image
 from pathlib import Path
 import os
-from typing import List
+from typing import Callable, List, Optional
 from threading import Thread, Event
 import time
-import pygame
 import csv
 from queue import Queue
 import sys
-import pickle
+import tempfile
+import numpy as np
 
-from display import ST7735R_Display
+from audio import AudioPlayer, LOOP_FOREVER
+from display import Display, DisplayWriter, ST7735R_Display
+from frameclock import FrameClock
+from overlay import Compositor
+from panel import FRAME_DTYPE, PANEL_WIDTH, PANEL_HEIGHT, image_to_frame
+from preview import write_previews
+from transition import Transition
 
 from led import Led
 
-pygame_is_initialized = False
-
 DEFAULT_LED_CSV   = str(Path(__file__).absolute().parent.parent.joinpath('led.csv'))
+FRAME_CACHE_NAME  = 'frames.npy'
+# How long the first frame waits for the audio to be heard
+AUDIO_START_TIMEOUT = 1.0
 
 
 class VideoPlayer:
 
     def __init__(self, fps: int, image_dir: str, audio_dir: str = None,
-                 leds: Led = None, width: int = 160, height: int = 128) -> None:
+                 leds: Led = None, width: int = 160, height: int = 128,
+                 display: Display = None, overlays: Compositor = None,
+                 led_csv: str = DEFAULT_LED_CSV, clock: Callable[[], float] = time.monotonic,
+                 lockstep: bool = False) -> None:
         self._fps          = fps
         self._image_dir    = image_dir
         self._width        = width
         self._height       = height
+        # In lockstep the video follows clock (shared between units) instead
+        # of the audio, see clocksync.py
+        self._clock        = clock
+        self._lockstep     = lockstep
 
-        self._display      = ST7735R_Display(width, height)
+        self._display      = display if display is not None else DisplayWriter(ST7735R_Display(width, height))
+        self._overlays     = overlays if overlays is not None else Compositor()
 
-        self._audio_player = AudioPlayer(audio_dir)
-        self._led_player   = LedPlayer(leds)
+        # Audio loops along with the video, and is the clock the video follows
+        self._audio_player = AudioPlayer(audio_dir, loops=LOOP_FOREVER)
+        self._led_player   = LedPlayer(leds, led_csv)
         self._playing      = Event()
+        # (frame, time) of a pending seek, see seek()
+        self._seek         = None
+        self._frames: np.ndarray = None
+        # Index of the frame on the display
+        self._frame        = None
+
+    def prepare(self) -> None:
+        ''' Loads the frames (converting them first if needed), audio and LED
+            cues, so start() can begin right away. Safe to call while another
+            video is playing. '''
+        if self._frames is None:
+            self._frames = self._get_frames()
+            # Frames are memory mapped, have the kernel read them in now
+            with open(self._get_cache_path(), 'rb') as f:
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+
+        self._audio_player.prepare()
+        self._led_player.prepare()
         
-    def start(self) -> None:
+    def start(self, transition: Transition = None, start_time: float = None) -> None:
+        ''' Plays until stopped. If a transition is given, the first frames are
+            blended with the video that played before. If start_time (in the
+            player's clock) is given, the first frame is shown at exactly that
+            time. '''
         if self._playing.is_set():
             print('Video already playing!')
             return
 
-        # Get all images
-        images = self._get_images()
+        # Set flag that we've started, so stop() works while images are loading
+        self._playing.set()
+
+        # Get all frames
+        self.prepare()
+        frames = self._frames
+
+        if start_time is not None:
+            time.sleep(max(0.0, start_time - self._clock()))
+
+        if not self.is_playing():
+            print('Video player stopped while loading')
+            return
         
         fps_counter  = 0
-        frame_delay  = 1 / self._fps
-        frame        = 0
-        total_frames = len(images)
+        frame_offset = 0
+        total_frames = len(frames)
 
         led_thread = Thread(target=self._led_player.start)
         led_thread.start()
         
-        #audio_thread = Thread(target=self._audio_player.start)
-        #audio_thread.start()
+        audio_thread = Thread(target=self._audio_player.start)
+        audio_thread.start()
+
+        # The video follows the audio, so hold the first frame until it's heard
+        follow_audio = not self._lockstep and self._audio_player.has_audio()
+        if follow_audio and not self._audio_player.wait_started(AUDIO_START_TIMEOUT):
+            print('Audio not started in time, video is not following it')
+            follow_audio = False
 
-        # Set flag that we've started
-        self._playing.set()
         print('Video player starting')
 
-        t0 = time.time()
+        clock = FrameClock(self._fps, self._clock)
+        # In lockstep, frame N is due at the same time on every unit, even
+        # if this one got going late
+        clock.start(start_time if self._lockstep else None)
+        tick  = 0
+        t0    = clock.now()
 
-        while self._playing.is_set():
-            image = images[frame]
-            frame = (frame + 1) % total_frames
+        if transition is not None:
+            transition.start(frames)
 
-            before_display = time.time()
-            self._display.show_image(image)
-            after_display = time.time()
+        while self._playing.is_set():
+            audio_position = self._audio_player.position() if follow_audio else None
+            if audio_position is not None:
+                # Follow the audio, skipping frames if we're behind it
+                clock.start(clock.now() - audio_position)
+                tick = clock.frame_at()
+            elif self._lockstep:
+                # Skip frames if we're behind the other units
+                tick = max(tick, clock.frame_at())
+
+            if self._seek is not None:
+                seek_frame, seek_time = self._seek
+                self._seek = None
+                if follow_audio:
+                    # The audio is moved, and the video follows it there
+                    tick, frame_offset = seek_frame % total_frames, 0
+                    clock.start(clock.now() - tick / self._fps)
+                else:
+                    # A seek stamped before the first frame applies from the first frame
+                    seek_tick = tick if seek_time is None else max(0, clock.frame_at(seek_time))
+                    frame_offset = seek_frame - seek_tick
+                self._audio_player.seek(((tick + frame_offset) % total_frames) / self._fps)
+
+            frame = (tick + frame_offset) % total_frames
+            self._frame = frame
+            if transition is not None and tick < transition.length:
+                panel_frame = transition.frame(tick)
+            else:
+                panel_frame = frames[frame]
+            self._display.show_frame(self._overlays.composite(panel_frame))
+            after_display = clock.now()
 
             dt = after_display - t0
             fps_counter += 1
 
             if dt > 1:
                 sys.stdout.write(f'\rFPS: {fps_counter}\n')
-                t0 = after_display + (1 - dt)
+                t0 = after_display
                 fps_counter = 0
 
-            next_frame = before_display + frame_delay
-            if next_frame > after_display:
-                time.sleep(next_frame - after_display)
+            # Without audio every frame is shown, so if we're running late,
+            # shift the clock instead of racing to catch up.
+            tick += 1
+            if clock.wait_for(tick) > 0 and audio_position is None and not self._lockstep:
+                clock.start(after_display - tick / self._fps)
                 
             if not self.is_playing():
                 break
 
         print('Video player ending')
+        if transition is not None:
+            transition.stop()
         led_thread.join()
-        #audio_thread.join()
+        audio_thread.join()
 
     def stop(self) -> None:
         print(self._playing.is_set())
@@ -100,6 +188,28 @@ class VideoPlayer:
     def is_playing(self) -> bool:
         return self._playing.is_set()
 
+    def has_frame_cache(self) -> bool:
+        ''' Without a frame cache, prepare() converts all images first, which is slow. '''
+        return os.path.exists(self._get_cache_path())
+
+    def has_audio(self) -> bool:
+        return self._audio_player.has_audio()
+
+    def seek(self, frame: int, at: float = None) -> None:
+        ''' Jumps to the given frame. May be called before start(). If at (in
+            the player's clock) is given, frame is the one due at that time,
+            so units in lockstep agree on it however late the seek arrives. '''
+        self._seek = (frame, at)
+
+    def upcoming_frames(self, count: int) -> Optional[np.ndarray]:
+        ''' The count frames that would have followed the one on the display,
+            or None if nothing has been shown yet. Works after stop(). '''
+        if self._frames is None or self._frame is None:
+            return None
+
+        indices = np.arange(self._frame + 1, self._frame + 1 + count) % len(self._frames)
+        return self._frames[indices]
+
     def _get_image_paths(self, image_dir: str) -> List[str]:
         image_names = []
 
@@ -124,36 +234,47 @@ class VideoPlayer:
         return image_paths
 
     def pickle(self) -> None:
-        pickle_path = self._get_pickled_path()
+        ''' Converts all images to panel frames and saves them to the frame
+            cache, along with the thumbnail and preview strip. '''
+        cache_path  = self._get_cache_path()
         image_paths = self._get_image_paths(self._image_dir)
 
-        images = []
+        frames = np.empty((len(image_paths), PANEL_HEIGHT, PANEL_WIDTH), dtype=FRAME_DTYPE)
         for i, image_path in enumerate(image_paths):
-            image = self._convert_image_path_to_pil_image(image_path)
-            images.append(image)
-            sys.stdout.write(f'\rResizing image: {i}')
+            frames[i] = image_to_frame(self._convert_image_path_to_pil_image(image_path))
+            sys.stdout.write(f'\rConverting image: {i}')
             
-        print(f'\nDone resizing images. Saving to {pickle_path}')
-            
-        with open(pickle_path, 'wb') as f:
-            pickle.dump(images, f)
-            
-        print('Done saving images!')
-
-    def _get_images(self) -> List['Image']:
-        pickled_path = self._get_pickled_path()
-        print(pickled_path)
+        print(f'\nDone converting images. Saving to {cache_path}')
+
+        # Written aside and moved in place, the server may map the cache
+        # while the webapp is still writing it
+        with tempfile.NamedTemporaryFile(dir=cache_path.parent, prefix=f'.{cache_path.name}.', suffix='.tmp',
+                                         delete=False) as f:
+            tmp_path = f.name
+            try:
+                np.save(f, frames)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+        os.replace(tmp_path, cache_path)
+
+        print('Done saving frames!')
+
+        write_previews(frames, cache_path.parent, self._fps)
+        print('Done saving previews!')
+
+    def _get_frames(self) -> np.ndarray:
+        cache_path = self._get_cache_path()
+        print(cache_path)
                 
-        if os.path.exists(pickled_path):
-            print(f'Pickled file {pickled_path} already exists.')
+        if os.path.exists(cache_path):
+            print(f'Frame cache {cache_path} already exists.')
         else:
-            print('Found no pickled file, resizing images...')
+            print('Found no frame cache, converting images...')
             self.pickle()
-        
-        with open(pickled_path, 'rb') as f:
-            images = pickle.load(f)
-            
-        return images
+
+        # Frames are ready to send as-is, so map them instead of reading them all up front
+        return np.load(cache_path, mmap_mode='r')
 
     def _convert_image_path_to_pil_image(self, image_path: str) -> Image:
         image = Image.open(image_path)
@@ -172,57 +293,8 @@ class VideoPlayer:
             self._images.put(image)
             image_path_index = (image_path_index + 1) % total_images
             
-    def _get_pickled_path(self) -> str:
-        return Path(self._image_dir).parent.joinpath('pickled')
-
-class AudioPlayer:
-
-    def __init__(self, audio_path: str) -> None:
-        self._audio_path = audio_path
-        if audio_path is None:
-            print('Audio path is None, not playing any audio!')
-            return
-
-        global pygame_is_initialized
-        if not pygame_is_initialized:
-            print('Initializing pygame mixer')
-            pygame.mixer.init()
-            pygame_is_initialized = True
-
-        self._is_playing = False
-        self._sound = pygame.mixer.Sound(audio_path)
-        print(f'Audio path: {audio_path}')
-
-    def start(self) -> None:
-        if self._audio_path is None:
-            return
-
-        if self.is_playing():
-            print('Audio already playing!')
-            return
-
-        print('Audio starting')
-        self._is_playing = True
-
-        playing = self._sound.play()
-        while playing.get_busy() and self.is_playing():
-            pygame.time.delay(100)
-
-        print('Audio stopping')
-        playing.stop()
-
-    def stop(self) -> None:
-        if self._audio_path is None:
-            return
-
-        if not self.is_playing():
-            print('Audio player not playing!')
-
-        self._is_playing = False
-
-    def is_playing(self) -> bool:
-        return self._is_playing
-
+    def _get_cache_path(self) -> str:
+        return Path(self._image_dir).parent.joinpath(FRAME_CACHE_NAME)
 
 LED_NUMBER_ALL = 0
 LedState = namedtuple('LedState', ['color', 'time', 'led_nbr'])
@@ -230,29 +302,37 @@ LedState = namedtuple('LedState', ['color', 'time', 'led_nbr'])
 
 class LedPlayer:
     
-    def __init__(self, leds: 'Led') -> None:
+    def __init__(self, leds: 'Led', led_csv: str = DEFAULT_LED_CSV) -> None:
         self.leds = leds
+        self._led_csv = led_csv
+        self._led_states: List[LedState] = None
         self._running = False
+
+    def prepare(self) -> None:
+        ''' Reads the LED cues, so start() doesn't have to. '''
+        if self._led_states is None and os.path.exists(self._led_csv):
+            self._led_states = self._parse_led_states(self._led_csv)
         
-    def start(self, led_csv: str = DEFAULT_LED_CSV) -> None:
-        if not os.path.exists(led_csv):
-            print(f'Led csv {led_csv} doesnt exists!')
+    def start(self, led_csv: str = None) -> None:
+        if led_csv is not None and led_csv != self._led_csv:
+            self._led_csv = led_csv
+            self._led_states = None
+
+        if not os.path.exists(self._led_csv):
+            print(f'Led csv {self._led_csv} doesnt exists!')
             return
 
-        led_states = self._parse_led_states(led_csv)
+        self.prepare()
+        led_states = self._led_states
         state_index = 0
         self._running = True
-        time_offset = 0.0
+        time_offset = time.time()
         
         print('Led player starting')
         
         while self._running:
             led_state = led_states[state_index]
-            
-            if led_state.led_nbr == LED_NUMBER_ALL:
-                self.leds.set_color(led_state.color)
-            else:
-                self.leds.set_color_single_led(led_state.led_nbr, led_state.color)
+            self._apply(led_state)
 
             # Peek at next state
             next_state_index = (state_index + 1) % len(led_states)
@@ -271,6 +351,16 @@ class LedPlayer:
             if state_index == 0:
                 time_offset = time.time()
                 
+    def _apply(self, led_state: LedState) -> None:
+        if self.leds is None:
+            # Headless, see play_video_server.py
+            return
+
+        if led_state.led_nbr == LED_NUMBER_ALL:
+            self.leds.set_color(led_state.color)
+        else:
+            self.leds.set_color_single_led(led_state.led_nbr, led_state.color)
+
     def stop(self) -> None:
         if not self._running:
             print('Led player not running')
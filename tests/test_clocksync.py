@@ -0,0 +1,93 @@
+from pathlib import Path
+import socket
+import sys
+import time
+from threading import Thread
+
+ROOT_PATH = Path(__file__).absolute().parent.parent
+src = str(ROOT_PATH.joinpath('src'))
+sys.path.append(src)
+
+from client import Client
+from clocksync import ClockSyncLeader, ClockSyncFollower, SYNC_MIN_SAMPLES, SYNC_INTERVAL
+from play_video_server import VideoPlayerServer
+
+IP = '127.0.0.1'
+# Long enough for a follower to be synced, with room to spare
+SYNC_WAIT = (SYNC_MIN_SAMPLES + 3) * SYNC_INTERVAL
+
+
+def free_port(kind: int) -> int:
+    with socket.socket(socket.AF_INET, kind) as sock:
+        sock.bind((IP, 0))
+        return sock.getsockname()[1]
+
+
+def wait_until(condition, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+
+def test_follower_syncs_to_leader():
+    sync_port = free_port(socket.SOCK_DGRAM)
+    leader = ClockSyncLeader(IP, sync_port)
+    follower = ClockSyncFollower(IP, 12345, sync_port)
+    leader.start()
+    follower.start()
+
+    try:
+        assert wait_until(follower.is_synced, SYNC_WAIT)
+        # Same machine, same monotonic clock
+        assert abs(follower.now() - leader.now()) < 0.001
+        assert wait_until(lambda: (IP, 12345) in leader.followers(), SYNC_WAIT)
+    finally:
+        follower.stop()
+        leader.stop()
+
+
+def start_server(sync, port: int) -> list:
+    ''' Starts a headless server, whose video commands are recorded instead of
+        run. Returns the list they're recorded in. '''
+    server = VideoPlayerServer(sync, headless=True)
+
+    received = []
+    for name in ('PLAY_VIDEO', 'SEEK_VIDEO'):
+        server._command_handlers[name] = lambda kwargs, name=name: received.append((name, kwargs))
+
+    Thread(target=server.start, args=(IP, port), daemon=True).start()
+    return received
+
+
+def test_leader_relays_stamped_commands():
+    sync_port = free_port(socket.SOCK_DGRAM)
+    leader_port = free_port(socket.SOCK_STREAM)
+    follower_port = free_port(socket.SOCK_STREAM)
+    leader_received = start_server(ClockSyncLeader(IP, sync_port), leader_port)
+    follower_received = start_server(ClockSyncFollower(IP, follower_port, sync_port), follower_port)
+
+    # The follower's own client, held open like the webapp's
+    local = Client(IP, follower_port)
+    assert wait_until(local.connect, SYNC_WAIT)
+
+    client = Client(IP, leader_port, timeout=5)
+    assert wait_until(lambda: 'followers: none' not in (client.status() or 'followers: none'), SYNC_WAIT)
+
+    with client.batch():
+        client.play_video('/videos/a/images', 30)
+        client.seek_video(120)
+    client.seek_video(10)
+
+    assert wait_until(lambda: len(follower_received) == 3, 5)
+    assert follower_received == leader_received
+
+    (_, play), (_, seek), (_, later_seek) = follower_received
+    assert seek['at'] == play['start_at']
+    assert seek['frame'] == 120
+    assert later_seek['at'] < play['start_at']
+
+    local.disconnect()
+    client.disconnect()
@@ -0,0 +1,69 @@
+from pathlib import Path
+import sys
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('PIL')
+
+ROOT_PATH = Path(__file__).absolute().parent.parent
+src = str(ROOT_PATH.joinpath('src'))
+sys.path.append(src)
+
+from liveplayer import JitterBuffer, LivePlayer
+from panel import blank_frame
+
+
+def test_playback_waits_until_primed():
+    buffer = JitterBuffer(capacity=3, prime=2)
+    buffer.push(blank_frame(1))
+    assert buffer.pop() is None
+
+    buffer.push(blank_frame(2))
+    assert buffer.pop()[0, 0] == 1
+    assert buffer.pop()[0, 0] == 2
+
+
+def test_full_buffer_drops_oldest():
+    buffer = JitterBuffer(capacity=3, prime=2)
+    for color in range(5):
+        buffer.push(blank_frame(color))
+
+    assert len(buffer) == 3
+    assert buffer.dropped == 2
+    assert [buffer.pop()[0, 0] for _ in range(3)] == [2, 3, 4]
+
+
+def test_underrun_primes_again():
+    buffer = JitterBuffer(capacity=3, prime=2)
+    buffer.push(blank_frame(1))
+    buffer.push(blank_frame(2))
+    buffer.pop()
+    buffer.pop()
+
+    assert buffer.pop() is None
+    assert buffer.underruns == 1
+
+    # One frame isn't enough to start again
+    buffer.push(blank_frame(3))
+    assert buffer.pop() is None
+    assert buffer.underruns == 1
+
+    buffer.push(blank_frame(4))
+    assert buffer.pop()[0, 0] == 3
+
+
+def test_skip_counts_as_dropped():
+    buffer = JitterBuffer(capacity=3, prime=1)
+    buffer.push(blank_frame(1))
+    buffer.push(blank_frame(2))
+    buffer.skip()
+
+    assert buffer.dropped == 1
+    assert buffer.pop()[0, 0] == 2
+
+
+def test_bad_address_fails_on_listen():
+    player = LivePlayer(30, 'udp:0.0.0.0:9998', display=object())
+    with pytest.raises(ValueError):
+        player.listen()
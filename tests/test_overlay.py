@@ -0,0 +1,81 @@
+from pathlib import Path
+import sys
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('PIL')
+
+ROOT_PATH = Path(__file__).absolute().parent.parent
+src = str(ROOT_PATH.joinpath('src'))
+sys.path.append(src)
+
+from overlay import Overlay, Compositor, hex_to_rgb565
+from panel import PANEL_WIDTH, PANEL_HEIGHT, VIDEO_HEIGHT, blank_frame
+
+GLYPH_WIDTH  = 6
+GLYPH_HEIGHT = 10
+
+
+class BlockAtlas:
+    ''' Every character is a solid block, in panel orientation. '''
+
+    def render(self, text: str) -> np.ndarray:
+        return np.ones((len(text) * GLYPH_WIDTH, GLYPH_HEIGHT), dtype=bool)
+
+
+def region_of(x: int, y: int, text: str = 'ab'):
+    return Overlay(text, x, y, atlas=BlockAtlas()).region
+
+
+def test_region_inside_panel():
+    region = region_of(10, 20)
+    assert (region.x, region.y) == (VIDEO_HEIGHT - 20 - GLYPH_HEIGHT, 10)
+    assert region.pixels.shape == (2 * GLYPH_WIDTH, GLYPH_HEIGHT)
+
+
+def test_region_clipped_at_right_edge():
+    region = region_of(PANEL_HEIGHT - 5, 0)
+    assert region.y == PANEL_HEIGHT - 5
+    assert region.pixels.shape == (5, GLYPH_HEIGHT)
+
+
+def test_region_clipped_at_bottom_edge():
+    region = region_of(0, VIDEO_HEIGHT - 3)
+    assert region.x == 0
+    assert region.pixels.shape == (2 * GLYPH_WIDTH, 3)
+
+
+def test_region_clipped_at_left_edge():
+    region = region_of(-4, 0)
+    assert region.y == 0
+    assert region.pixels.shape == (2 * GLYPH_WIDTH - 4, GLYPH_HEIGHT)
+
+
+def test_region_off_panel_is_empty():
+    region = region_of(PANEL_HEIGHT + 10, 0)
+    assert region.pixels.size == 0
+
+    # Still paints without complaint
+    compositor = Compositor()
+    compositor.set_overlay('score', Overlay('ab', PANEL_HEIGHT + 10, 0, atlas=BlockAtlas()))
+    assert np.array_equal(compositor.composite(blank_frame()), blank_frame())
+
+
+def test_composite_leaves_frame_untouched():
+    frame = blank_frame()
+    compositor = Compositor()
+    overlay = Overlay('ab', PANEL_HEIGHT - 5, 0, color='#ff0000', atlas=BlockAtlas())
+    compositor.set_overlay('score', overlay)
+
+    composited = compositor.composite(frame)
+    region = overlay.region
+    assert composited.shape == (PANEL_HEIGHT, PANEL_WIDTH)
+    assert (composited[region.y:, region.x:region.x + GLYPH_HEIGHT] == hex_to_rgb565('#ff0000')).all()
+    assert not frame.any()
+
+
+def test_style_is_kept_as_given():
+    overlay = Overlay('ab', 3, 4, color='#00ff00', background=None, atlas=BlockAtlas())
+    assert (overlay.x, overlay.y, overlay.color, overlay.background) == (3, 4, '#00ff00', None)
+    assert overlay.region.mask is not None
@@ -0,0 +1,129 @@
+from pathlib import Path
+import socket
+import sys
+
+import pytest
+
+ROOT_PATH = Path(__file__).absolute().parent.parent
+src = str(ROOT_PATH.joinpath('src'))
+sys.path.append(src)
+
+import protocol
+from protocol import Command, Result, ProtocolError
+from play_video_server import VideoPlayerServer
+
+
+def payload_of(frame: bytes) -> bytes:
+    return frame[protocol.HEADER.size:]
+
+
+def read(frame: bytes):
+    ''' Reads frame back through a socket, like the server does. '''
+    a, b = socket.socketpair()
+    with a, b:
+        a.sendall(frame)
+        a.shutdown(socket.SHUT_WR)
+        return protocol.read_frame(b)
+
+
+def test_request_round_trip():
+    commands = [
+        Command('PLAY_VIDEO', {'image_dir': Path('/videos/a b/images'), 'fps': 30, 'start_at': 1.5}),
+        Command('SET_OVERLAY', {'text': 'HOME 3 - 1 ÅÄÖ', 'background': None, 'flag': True}),
+        Command('RAW', {'data': b'\x00\xff'}),
+        Command('STATUS', {}),
+    ]
+    kind, request_id, payload = read(protocol.encode_request(7, commands))
+
+    assert (kind, request_id) == (protocol.KIND_REQUEST, 7)
+    decoded = protocol.decode_commands(payload)
+    assert decoded[0].kwargs['image_dir'] == '/videos/a b/images'
+    assert decoded[1:] == commands[1:]
+    assert decoded[0].kwargs['fps'] == 30 and decoded[0].kwargs['start_at'] == 1.5
+
+
+def test_reply_round_trip():
+    results = [Result(protocol.STATUS_OK, 'OK'), Result(protocol.STATUS_SKIPPED, 'SKIPPED')]
+    kind, request_id, payload = read(protocol.encode_reply(3, results))
+
+    assert (kind, request_id) == (protocol.KIND_REPLY, 3)
+    assert protocol.decode_results(payload) == results
+
+
+def test_truncated_payload():
+    payload = payload_of(protocol.encode_request(1, [Command('PLAY_VIDEO', {'fps': 30})]))
+    for end in range(len(payload)):
+        with pytest.raises(ProtocolError):
+            protocol.decode_commands(payload[:end])
+
+
+def test_trailing_bytes():
+    payload = payload_of(protocol.encode_request(1, [Command('STATUS', {})]))
+    with pytest.raises(ProtocolError):
+        protocol.decode_commands(payload + b'\x00')
+
+
+def test_truncated_frame():
+    frame = protocol.encode_request(1, [Command('STATUS', {})])
+    with pytest.raises(ConnectionResetError):
+        read(frame[:-1])
+
+
+def test_oversized_frame():
+    header = protocol.HEADER.pack(protocol.MAGIC, protocol.PROTOCOL_VERSION, protocol.KIND_REQUEST,
+                                  1, protocol.MAX_PAYLOAD_SIZE + 1)
+    with pytest.raises(ProtocolError):
+        read(header)
+
+    with pytest.raises(ProtocolError):
+        protocol.encode_request(1, [Command('PLAY_VIDEO', {'data': b'x' * protocol.MAX_PAYLOAD_SIZE})])
+
+
+def test_bad_magic_and_version():
+    frame = protocol.encode_request(1, [Command('STATUS', {})])
+    with pytest.raises(ProtocolError):
+        read(b'XX' + frame[2:])
+    with pytest.raises(ProtocolError):
+        read(frame[:2] + bytes([protocol.PROTOCOL_VERSION + 1]) + frame[3:])
+
+
+def test_invalid_utf8():
+    payload = protocol.U16.pack(1) + protocol.U16.pack(2) + b'\xff\xfe' + protocol.U8.pack(0)
+    with pytest.raises(ProtocolError):
+        protocol.decode_commands(payload)
+
+
+def test_unknown_type_tag():
+    payload = payload_of(protocol.encode_request(1, [Command('STATUS', {'a': None})]))
+    with pytest.raises(ProtocolError):
+        protocol.decode_commands(payload.replace(protocol.TYPE_NONE, b'X'))
+
+
+def test_encode_limits():
+    with pytest.raises(ProtocolError):
+        protocol.encode_request(1, [Command('STATUS', {'k' * 0x10000: 1})])
+    with pytest.raises(ProtocolError):
+        protocol.encode_request(1, [Command('STATUS', {str(i): i for i in range(256)})])
+    with pytest.raises(ProtocolError):
+        protocol.encode_request(1, [Command('STATUS', {'big': 1 << 63})])
+    with pytest.raises(ProtocolError):
+        protocol.encode_request(1, [Command('STATUS', {'obj': object()})])
+
+
+def test_batch_stops_at_first_failure():
+    server = VideoPlayerServer()
+    results = server._execute([
+        Command('SCHEDULE_CLEAR', {}),
+        Command('SCHEDULE_REMOVE', {'id': 42}),
+        Command('SCHEDULE_CLEAR', {}),
+    ])
+
+    assert [result.status for result in results] == \
+           [protocol.STATUS_OK, protocol.STATUS_ERROR, protocol.STATUS_SKIPPED]
+
+
+def test_batch_with_unknown_command_runs_nothing():
+    server = VideoPlayerServer()
+    results = server._execute([Command('SCHEDULE_CLEAR', {}), Command('NOPE', {})])
+
+    assert all(result.status == protocol.STATUS_ERROR for result in results)
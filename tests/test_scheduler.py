@@ -0,0 +1,121 @@
+from pathlib import Path
+import sys
+import time
+from datetime import datetime
+
+import pytest
+
+ROOT_PATH = Path(__file__).absolute().parent.parent
+src = str(ROOT_PATH.joinpath('src'))
+sys.path.append(src)
+
+from scheduler import Scheduler, parse_start, LATE_LIMIT
+
+
+def wait_until(condition, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def start_scheduler(fail_on: str = None):
+    ''' Returns a running scheduler and the list of (image_dir, time) it plays. '''
+    played = []
+
+    def prepare(entry):
+        if entry.image_dir == fail_on:
+            raise RuntimeError('Broken video')
+        return entry.image_dir
+
+    def play(entry, prepared):
+        assert prepared == entry.image_dir
+        played.append((entry.image_dir, time.time()))
+
+    scheduler = Scheduler(prepare, play)
+    scheduler.start()
+    return scheduler, played
+
+
+def test_entries_play_in_start_order():
+    scheduler, played = start_scheduler()
+    now = time.time()
+    try:
+        scheduler.add(now + 0.6, 'c', 30)
+        scheduler.add(now + 0.2, 'a', 30)
+        scheduler.add(now + 0.4, 'b', 30)
+        assert [entry.image_dir for entry in scheduler.entries()] == ['a', 'b', 'c']
+
+        assert wait_until(lambda: len(played) == 3, 2)
+    finally:
+        scheduler.stop()
+
+    assert [image_dir for image_dir, _ in played] == ['a', 'b', 'c']
+    # Played entries drop off the schedule
+    assert scheduler.entries() == []
+
+
+def test_failed_entry_is_dropped():
+    scheduler, played = start_scheduler(fail_on='a')
+    now = time.time()
+    try:
+        scheduler.add(now + 0.2, 'a', 30)
+        scheduler.add(now + 0.4, 'b', 30)
+        assert wait_until(lambda: len(played) == 1, 2)
+    finally:
+        scheduler.stop()
+
+    assert played[0][0] == 'b'
+    assert scheduler.entries() == []
+
+
+def test_removed_entry_is_not_played():
+    scheduler, played = start_scheduler()
+    now = time.time()
+    try:
+        entry = scheduler.add(now + 0.2, 'a', 30)
+        scheduler.add(now + 0.4, 'b', 30)
+        assert scheduler.remove(entry.id) == entry
+        assert wait_until(lambda: len(played) == 1, 2)
+    finally:
+        scheduler.stop()
+
+    assert played[0][0] == 'b'
+
+
+def test_same_start_is_rejected():
+    scheduler = Scheduler(lambda entry: None, lambda entry, prepared: None)
+    start = time.time() + 60
+    scheduler.add(start, 'a', 30)
+    with pytest.raises(ValueError):
+        scheduler.add(start, 'b', 30)
+    assert len(scheduler.entries()) == 1
+
+
+def test_late_entries_are_pruned():
+    scheduler = Scheduler(lambda entry: None, lambda entry, prepared: None)
+    now = time.time()
+    scheduler.add(now - LATE_LIMIT - 1, 'late', 30)
+    scheduler.add(now + 60, 'later', 30)
+    assert [entry.image_dir for entry in scheduler.entries()] == ['later']
+
+
+def test_parse_start():
+    now = time.time()
+    assert parse_start(now + 5) == now + 5
+    assert parse_start(str(now + 5)) == now + 5
+    assert abs(parse_start('+30') - (now + 30)) < 1
+
+    start = parse_start('12:00')
+    assert 0 <= start - now <= 24 * 60 * 60
+    assert datetime.fromtimestamp(start).strftime('%H:%M:%S') == '12:00:00'
+
+    with pytest.raises(ValueError):
+        parse_start(now - 60)
+    with pytest.raises(ValueError):
+        # Most likely meant 19:00
+        parse_start('19')
+    with pytest.raises(ValueError):
+        parse_start('soon')
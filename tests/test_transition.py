@@ -0,0 +1,84 @@
+from pathlib import Path
+import sys
+import time
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+ROOT_PATH = Path(__file__).absolute().parent.parent
+src = str(ROOT_PATH.joinpath('src'))
+sys.path.append(src)
+
+from panel import FRAME_DTYPE, PANEL_WIDTH, PANEL_HEIGHT, blank_frame
+from transition import Transition, crossfade, wipe, ALPHA_BITS, ALPHA_MAX, RENDER_TIMEOUT
+
+
+def random_frames(count: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 1 << 16, (count, PANEL_HEIGHT, PANEL_WIDTH)).astype(FRAME_DTYPE)
+
+
+def channels(frame: np.ndarray):
+    color = frame.astype(np.uint32)
+    return color >> 11, (color >> 5) & 0x3F, color & 0x1F
+
+
+def test_crossfade_ends():
+    outgoing, incoming = random_frames(2, 0)
+    assert np.array_equal(crossfade(outgoing, incoming, 0), outgoing)
+    assert np.array_equal(crossfade(outgoing, incoming, 1), incoming)
+
+
+def test_crossfade_blends_each_channel():
+    outgoing, incoming = random_frames(2, 1)
+    for progress in (0.1, 0.25, 0.5, 0.9):
+        blended = crossfade(outgoing, incoming, progress)
+        assert blended.dtype == np.dtype(FRAME_DTYPE)
+
+        # No channel spills into its neighbour
+        alpha = int(round(progress * ALPHA_MAX))
+        for old, new, result in zip(channels(outgoing), channels(incoming), channels(blended)):
+            assert np.array_equal(result, (old * (ALPHA_MAX - alpha) + new * alpha) >> ALPHA_BITS)
+
+
+def test_crossfade_white_to_black():
+    blended = crossfade(blank_frame(0xFFFF), blank_frame(0), 0.5)
+    assert blended[0, 0] == (15 << 11) | (31 << 5) | 15
+
+
+def test_wipe():
+    outgoing, incoming = random_frames(2, 2)
+    wiped = wipe(outgoing, incoming, 0.25)
+    rows = PANEL_HEIGHT // 4
+    assert np.array_equal(wiped[:rows], incoming[:rows])
+    assert np.array_equal(wiped[rows:], outgoing[rows:])
+
+
+def test_transition_frames_can_be_asked_for_again():
+    outgoing, incoming = random_frames(4, 3), random_frames(8, 4)
+    transition = Transition('crossfade', outgoing)
+    transition.start(incoming)
+
+    first = [transition.frame(step) for step in range(4)]
+    start = time.monotonic()
+    again = transition.frame(1)
+    assert time.monotonic() - start < RENDER_TIMEOUT / 2
+
+    assert np.array_equal(again, first[1])
+    assert np.array_equal(first[3], crossfade(outgoing[3], incoming[3], 4 / 5))
+    transition.stop()
+
+
+def test_stopped_transition_cuts_to_incoming():
+    outgoing, incoming = random_frames(4, 5), random_frames(4, 6)
+    transition = Transition('crossfade', outgoing)
+    transition.stop()
+    transition.start(incoming)
+
+    assert np.array_equal(transition.frame(2), incoming[2])
+
+
+def test_unknown_effect():
+    with pytest.raises(ValueError):
+        Transition('spin', random_frames(1, 7))
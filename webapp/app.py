@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, redirect, send_file, abort
 import sys
 import json
 from werkzeug.datastructures import FileStorage
@@ -10,15 +10,24 @@ from typing import List
 from threading import Thread
 import subprocess
 import logging
+from datetime import datetime
 
 # Fix import path
 sys.path.append(str(Path(__file__).absolute().parent.parent.joinpath('src')))
 from client import Client
+from audio import ffmpeg_audio_command
+from display import Display
+from panel import VIDEO_WIDTH, VIDEO_HEIGHT
+from preview import THUMBNAIL_NAME, PREVIEW_NAME, get_preview
+from videoplayer import VideoPlayer
 
 
 PROJECT_ROOT_PATH = Path(__file__).absolute().parent.parent
 VIDEO_DIR = PROJECT_ROOT_PATH.joinpath('videos')
 
+# Browsers revalidate previews with their ETag after this many seconds
+PREVIEW_MAX_AGE = 3600
+
 stdout_debug = Queue()
 
 
@@ -67,14 +76,21 @@ class Status:
 def convert_video(video_path: str, image_path: str, audio_path: str, fps: int) -> None:
     cmd = f'ffmpeg -i {video_path} -r {fps} -f image2 {image_path}/image-%4d.jpg'
     logger.info('Converting video to images using ffmpeg...')
-    subprocess.Popen(cmd.split(' '), stdout=stdout, stderr=stdout)
+    subprocess.run(cmd.split(' '), stdout=stdout, stderr=stdout)
     logger.info('Video conversion complete!')
 
+    # Transcoded to the mixer's native format, so nothing is resampled at play time
     logger.info('Extracting audio...')
-    cmd = f'ffmpeg -i {video_path} -q:a 0 -map a {audio_path}'
-    subprocess.Popen(cmd.split(' '), stdout=stdout, stderr=stdout)
+    cmd = ffmpeg_audio_command(video_path, audio_path)
+    subprocess.run(cmd, stdout=stdout, stderr=stdout)
     logger.info('Audio extraction complete!')
 
+    # Frame cache, thumbnail and preview strip, so the first play and the
+    # listing don't have to
+    logger.info('Building frame cache and previews...')
+    VideoPlayer(int(fps), image_path, display=Display(VIDEO_WIDTH, VIDEO_HEIGHT)).pickle()
+    logger.info('Frame cache and previews complete!')
+
 
 class VideoDirectory:
 
@@ -163,8 +179,10 @@ def play():
 
     video = video_dir.get_video(video)
 
+    transition = data.get('transition') or None
+
     logger.info(f'Playing {video.name}')
-    client.play_video(video.image_path, video.fps, video.audio_path)
+    client.play_video(video.image_path, video.fps, video.audio_path, transition)
 
     return ('', 204)
 
@@ -184,6 +202,70 @@ def set_color():
     return ('', 204)
 
 
+@app.route('/set_overlay', methods=['POST'])
+def set_overlay():
+    text = request.form.get('text', '')
+    logger.info(f'Setting overlay: {text}')
+    if text:
+        client.set_overlay(text)
+    else:
+        client.clear_overlay()
+    return ('', 204)
+
+
+@app.route('/schedule', methods=['GET', 'POST'])
+def schedule():
+
+    if request.method == 'POST':
+        video = video_dir.get_video(request.form.get('video'))
+        start = request.form.get('start')
+        transition = request.form.get('transition') or None
+        logger.info(f'Scheduling {video.name} at {start}')
+        client.schedule_add(start, video.image_path, video.fps, video.audio_path, transition)
+
+    entries = client.schedule_list()
+    for entry in entries:
+        entry['time'] = datetime.fromtimestamp(entry['start']).strftime('%Y-%m-%d %H:%M:%S')
+        entry['name'] = Path(entry['image_dir']).parent.name
+
+    return render_template(
+        'schedule.html',
+        videos=video_dir.get_videos(),
+        entries=entries
+    )
+
+
+@app.route('/schedule/remove', methods=['POST'])
+def schedule_remove():
+    entry_id = request.form.get('id')
+    logger.info(f'Removing schedule entry {entry_id}')
+    client.schedule_remove(int(entry_id))
+    return redirect('/schedule')
+
+
+@app.route('/thumbnail/<video_name>')
+def thumbnail(video_name: str):
+    return send_preview(video_name, THUMBNAIL_NAME)
+
+
+@app.route('/preview/<video_name>')
+def preview(video_name: str):
+    return send_preview(video_name, PREVIEW_NAME)
+
+
+def send_preview(video_name: str, name: str):
+    video = video_dir.get_video(video_name)
+    if video is None:
+        abort(404)
+
+    path = get_preview(video.abs_path, name, video.fps)
+    if path is None:
+        # Not converted yet
+        abort(404)
+
+    return send_file(path, mimetype='image/png', conditional=True, etag=True, max_age=PREVIEW_MAX_AGE)
+
+
 @app.route('/status')
 def status():
     if stdout_debug.empty():